@@ -0,0 +1,262 @@
+"""Parallel batch analysis of a directory of projects into one portfolio summary"""
+import argparse
+import contextlib
+import os
+import sqlite3
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Optional
+
+import openpyxl
+
+import data_formats
+import database
+import main as es_main
+
+SUMMARY_COLUMNS = [
+    ("Project", 'project'),
+    ("File", 'file'),
+    ("Status", 'status'),
+    ("Periods", 'num_periods'),
+    ("ES", 'final_es'),
+    ("SPI(t)", 'final_spi_t'),
+    ("IEAC(t)", 'final_ieac_t'),
+    ("Controlling Path", 'controlling_path'),
+    ("Controlling Path IEAC(t)", 'controlling_ieac_t'),
+    ("Anomalies", 'num_anomalies'),
+    ("Project ID", 'project_id'),
+    ("Analysis ID", 'analysis_id'),
+    ("Error", 'error'),
+]
+
+
+def find_project_files(directory: str) -> List[Tuple[str, str]]:
+    """
+    List the project input files in a directory.
+
+    Args:
+        directory: Directory to search (not recursive)
+
+    Returns:
+        List of (project name, file path); the name is the file name without
+        extension, or with it when two files share a name
+    """
+    files = []
+    for entry in sorted(os.listdir(directory)):
+        path = os.path.join(directory, entry)
+        ext = os.path.splitext(entry)[1].lower()
+        if os.path.isfile(path) and ext in data_formats.LOADERS and not entry.startswith('~$'):
+            files.append((entry, path))
+
+    stems = [os.path.splitext(entry)[0] for entry, _ in files]
+    return [(stem if stems.count(stem) == 1 else entry, path)
+            for stem, (entry, path) in zip(stems, files)]
+
+
+def _summarize(name: str, excel_file: str, results: Optional[Dict] = None,
+               error: Optional[str] = None) -> Dict:
+    """Build one portfolio summary row from a project's results or its error"""
+    summary = {key: None for _, key in SUMMARY_COLUMNS}
+    summary.update(project=name, file=excel_file, status='failed' if error else 'ok', error=error)
+    if results:
+        final_es, final_spi_t, final_ieac_t = results['overall_metrics'][-1]
+        final_path = results['controlling_path'][-1]
+        summary.update(
+            num_periods=len(results['overall_metrics']),
+            final_es=final_es,
+            final_spi_t=final_spi_t,
+            final_ieac_t=final_ieac_t,
+            controlling_path=final_path,
+            controlling_ieac_t=results['path_metrics'][final_path][-1][3],
+            num_anomalies=len(results['anomalies']),
+        )
+    return summary
+
+
+def analyze_batch(projects: List[Tuple[str, str]], output_dir: str, db_path: Optional[str] = "es_analysis.db",
+                  generate_charts: bool = False, prune_paths: bool = False, use_cache: bool = True,
+                  db_timeout: float = 60.0) -> List[Dict]:
+    """
+    Analyze a batch of projects one after another, storing each as soon as it finishes.
+
+    Runs inside a worker process. A project that fails to load, analyze or
+    store is reported and skipped; if the database cannot be opened, the
+    project is still analyzed, reported as failed, and the next one tries
+    to open it again. Each project is stored in a transaction
+    of its own, so only its summary row is kept after that and memory does
+    not grow with the batch. Projects whose identical analysis is already
+    stored reuse it. Each project's output and console log go to
+    output_dir/<project name>/.
+
+    Args:
+        projects: List of (project name, file path)
+        output_dir: Directory for the per-project output directories
+        db_path: SQLite database to store the analyses in (None to skip)
+        generate_charts: Render the PNG charts for each project
+        prune_paths: Passed to main.analyze_project
+        use_cache: Passed to main.load_project_input
+        db_timeout: Seconds to wait for other workers' database writes
+
+    Returns:
+        List of portfolio summary rows, in the order of projects
+    """
+    summaries = []
+    db = None
+
+    try:
+        for name, excel_file in projects:
+            # Open the database for the first project, and again for the next if it failed
+            db_error = None
+            if db is None and db_path is not None:
+                try:
+                    db = database.get_db_instance(db_path, timeout=db_timeout)
+                except sqlite3.Error as e:
+                    db_error = f"Database: {e}"
+            summary = _analyze_one(name, excel_file, output_dir, db, generate_charts,
+                                   prune_paths, use_cache)
+            if db_error is not None and summary['status'] == 'ok':
+                summary.update(status='failed', error=db_error)
+            summaries.append(summary)
+    finally:
+        if db is not None:
+            db.close()
+
+    return summaries
+
+
+def _analyze_one(name: str, excel_file: str, output_dir: str, db: Optional[database.ESDatabase],
+                 generate_charts: bool, prune_paths: bool, use_cache: bool) -> Dict:
+    """Analyze and store one project of a batch, returning its summary row"""
+    project_dir = os.path.join(output_dir, name)
+    os.makedirs(project_dir, exist_ok=True)
+    with open(os.path.join(project_dir, "analysis.log"), 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            project_data = es_main.load_project_input(excel_file, use_cache)
+            results = es_main.analyze_project(
+                excel_file, project_dir, name, prune_paths=prune_paths,
+                generate_charts=generate_charts, save_to_db=False, db=db, project_data=project_data)
+        except Exception as e:
+            traceback.print_exc(file=log)
+            return _summarize(name, excel_file, error=f"{type(e).__name__}: {e}")
+
+    summary = _summarize(name, excel_file, results)
+    if 'analysis_id' in results:  # Reused an identical stored analysis
+        summary.update(project_id=results['project_id'], analysis_id=results['analysis_id'])
+    elif db is not None:
+        try:
+            summary['project_id'], summary['analysis_id'] = es_main.save_results_to_db(
+                db, name, excel_file, project_data, results)
+        except sqlite3.Error as e:
+            summary.update(status='failed', error=f"Database: {e}")
+    return summary
+
+
+def _split_batches(projects: List[Tuple[str, str]], num_batches: int) -> List[List[Tuple[str, str]]]:
+    """Deal projects, largest files first, round-robin into at most num_batches batches"""
+    by_size = sorted(projects, key=lambda project: os.path.getsize(project[1]), reverse=True)
+    batches = [by_size[i::num_batches] for i in range(num_batches)]
+    return [batch for batch in batches if batch]
+
+
+def analyze_portfolio(directory: str, output_dir: str = "results", workers: Optional[int] = None,
+                      db_path: Optional[str] = "es_analysis.db", generate_charts: bool = False,
+                      prune_paths: bool = False, use_cache: bool = True) -> List[Dict]:
+    """
+    Analyze every project file in a directory with a pool of worker processes.
+
+    Projects are dealt into one batch per worker; each worker stores every
+    project as soon as it finishes and keeps only its summary row. The
+    consolidated summary is written to output_dir/portfolio_summary.xlsx.
+
+    Args:
+        directory: Directory of project files (.xlsx, .csv, .jsonl, .npz)
+        output_dir: Directory for the per-project results and the summary
+        workers: Number of worker processes (defaults to the CPU count; 1 runs in-process)
+        db_path: SQLite database to store the analyses in (None to skip)
+        generate_charts: Render the PNG charts for each project
+        prune_paths: Passed to main.analyze_project
+        use_cache: Reuse parsed workbook data when the file content is unchanged
+
+    Returns:
+        List of portfolio summary rows, sorted by project name
+    """
+    projects = find_project_files(directory)
+    if not projects:
+        print(f"No project files found in {directory}")
+        return []
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(projects)))
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Analyzing {len(projects)} projects with {workers} worker(s)...")
+
+    options = dict(output_dir=output_dir, db_path=db_path, generate_charts=generate_charts,
+                   prune_paths=prune_paths, use_cache=use_cache)
+    summaries = []
+
+    def report(batch_summaries):
+        for summary in batch_summaries:
+            summaries.append(summary)
+            status = "OK" if summary['status'] == 'ok' else f"FAILED ({summary['error']})"
+            print(f"  [{len(summaries)}/{len(projects)}] {summary['project']}: {status}")
+
+    if workers == 1:
+        report(analyze_batch(projects, **options))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(analyze_batch, batch, **options): batch
+                       for batch in _split_batches(projects, workers)}
+            for future in as_completed(futures):
+                try:
+                    report(future.result())
+                except Exception as e:  # The worker process itself died
+                    report([_summarize(name, excel_file, error=f"Worker: {type(e).__name__}: {e}")
+                            for name, excel_file in futures[future]])
+
+    summaries.sort(key=lambda summary: summary['project'])
+    summary_file = os.path.join(output_dir, "portfolio_summary.xlsx")
+    write_portfolio_summary(summaries, summary_file)
+
+    failed = sum(1 for summary in summaries if summary['status'] != 'ok')
+    print(f"\n{len(summaries) - failed} projects analyzed, {failed} failed")
+    print(f"Portfolio summary written to {summary_file}")
+    return summaries
+
+
+def write_portfolio_summary(summaries: List[Dict], output_file: str) -> None:
+    """
+    Write portfolio summary rows to an Excel file, one row per project.
+
+    Args:
+        summaries: Rows as returned by analyze_portfolio
+        output_file: Output Excel file path
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Portfolio Summary")
+    ws.append([header for header, _ in SUMMARY_COLUMNS])
+    for summary in summaries:
+        ws.append([summary[key] for _, key in SUMMARY_COLUMNS])
+    wb.save(output_file)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Earned Schedule analysis of a directory of projects")
+    parser.add_argument("directory", help="Directory of project files (.xlsx, .csv, .jsonl, .npz)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output-dir", default="results", help="Output directory (default: results)")
+    parser.add_argument("--db", default="es_analysis.db", help="SQLite database file (default: es_analysis.db)")
+    parser.add_argument("--no-db", action="store_true", help="Do not store the analyses in the database")
+    parser.add_argument("--charts", action="store_true", help="Render charts for every project")
+    parser.add_argument("--prune-paths", action="store_true", help="Skip paths that cannot become controlling")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-parse the workbooks")
+    args = parser.parse_args(argv)
+
+    summaries = analyze_portfolio(args.directory, args.output_dir, args.workers,
+                                  None if args.no_db else args.db, args.charts,
+                                  args.prune_paths, not args.no_cache)
+    if any(summary['status'] != 'ok' for summary in summaries):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
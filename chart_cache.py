@@ -0,0 +1,74 @@
+"""In-memory LRU cache of rendered chart PNGs, keyed by analysis, chart and size."""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+DEFAULT_MAX_SIZE_MB = 64
+
+
+class ChartCache:
+    """
+    Renders charts on first request and keeps the PNGs, least recently used
+    first out once the cache exceeds max_size_mb.
+
+    Concurrent requests for the same chart wait for one render instead of
+    each rendering it.
+    """
+
+    def __init__(self, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        self.max_bytes = max_size_mb * 1024 * 1024
+        self._entries = OrderedDict()  # (analysis key, chart, width) -> PNG bytes
+        self._size = 0
+        self._lock = threading.Lock()
+        self._rendering = {}  # Key -> lock held while that chart renders
+
+    def get(self, analysis_key: Hashable, chart: str, width: Optional[int],
+            render: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+        """
+        Return a chart's PNG, calling render() to produce it on a cache miss.
+
+        Args:
+            analysis_key: Identifies the analysis (e.g. its database ID)
+            chart: Chart name
+            width: Image width in pixels (None for the default size)
+            render: Produces the PNG bytes, or None if the chart does not apply
+
+        Returns:
+            PNG bytes, or None if the chart does not apply
+        """
+        key = (analysis_key, chart, width)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            render_lock = self._rendering.setdefault(key, threading.Lock())
+
+        with render_lock:
+            with self._lock:
+                if key in self._entries:  # Rendered while we waited
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+            png = None
+            try:
+                png = render()
+            finally:
+                # Cache the PNG before releasing the render lock, so no request
+                # finds neither and renders again
+                with self._lock:
+                    if png is not None and key not in self._entries:
+                        self._entries[key] = png
+                        self._size += len(png)
+                        self._evict()
+                    self._rendering.pop(key, None)
+            return png
+
+    def _evict(self) -> None:
+        """Drop least recently used charts until the cache fits (lock held)"""
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            _, png = self._entries.popitem(last=False)
+            self._size -= len(png)
+
+    def stats(self) -> Dict:
+        """Number of cached charts and their total size in bytes"""
+        with self._lock:
+            return {"charts": len(self._entries), "bytes": self._size}
@@ -0,0 +1,363 @@
+"""Loaders for non-Excel project inputs (CSV, JSON Lines, NumPy .npz).
+
+All loaders return the same project data dictionary as
+data_handler.load_project_data.
+
+CSV and JSON Lines files hold one record per series and period:
+
+    series,period,pv,ev
+    project,0,0,0
+    Path1-4-8-10,0,0,0
+
+The series "project" is the overall project; any other name is a path.
+PV/EV may be "XX" markers as in the workbook. Project settings come first:
+in CSV as comment lines ("# planned_duration = 10", "# start_date =
+2025-01-01", "# path.Path1-4-8-10 = 1-4-8-10"), in JSON Lines as a first
+object without a "series" key ({"planned_duration": 10, "start_date":
+"2025-01-01", "paths": {"Path1-4-8-10": ["1", "4", "8", "10"]}}).
+"""
+import csv
+import json
+import os
+from datetime import datetime
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+import data_handler
+
+PROJECT_SERIES = "project"
+DEFAULT_CHUNK_SIZE = 100000
+
+
+def _parse_value(value):
+    """Convert a CSV/JSON PV or EV cell: "XX" markers stay, blanks become None"""
+    if value is None or value == "":
+        return None
+    if value == "XX":
+        return value
+    return float(value)
+
+
+def _parse_start_date(value):
+    """Parse an ISO start date, keeping other values as they are"""
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+def _read_csv_header(f) -> Tuple[Dict, List[str]]:
+    """Read '# key = value' settings lines and the column header of a CSV file"""
+    settings = {}
+    paths = {}
+    for line in f:
+        if not line.startswith('#'):
+            return {**settings, 'paths': paths}, next(csv.reader([line]))
+        key, _, value = line[1:].partition('=')
+        key = key.strip()
+        value = value.strip()
+        if key.startswith('path.'):
+            paths[key[len('path.'):]] = value.split('-') if value else []
+        elif key:
+            settings[key] = value
+    raise ValueError("CSV file has no column header")
+
+
+def iter_record_chunks(filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[Dict, Iterator[Dict]]:
+    """
+    Read the settings of a CSV or JSON Lines project file and iterate its records in chunks.
+
+    Records are parsed lazily, one chunk of Python lists at a time.
+
+    Args:
+        filename: Path to a .csv or .jsonl file
+        chunk_size: Number of records per chunk
+
+    Returns:
+        Tuple of (settings, iterator of chunks); each chunk is a dictionary
+        of equally long lists 'series', 'period', 'pv' and 'ev'
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    f = open(filename, newline='' if ext == '.csv' else None)
+
+    try:
+        if ext == '.csv':
+            settings, header = _read_csv_header(f)
+            columns = [name.strip().lower() for name in header]
+            missing = {'series', 'period', 'pv', 'ev'} - set(columns)
+            if missing:
+                raise ValueError(f"CSV file is missing columns: {', '.join(sorted(missing))}")
+            positions = [columns.index(name) for name in ('series', 'period', 'pv', 'ev')]
+            records = ([row[i] for i in positions] for row in csv.reader(f) if row)
+        elif ext == '.jsonl':
+            first = f.readline()
+            settings = json.loads(first) if first.strip() else {}
+            if 'series' in settings:
+                raise ValueError("JSON Lines file must start with a settings object")
+            records = ((r['series'], r['period'], r.get('pv'), r.get('ev'))
+                       for r in (json.loads(line) for line in f if line.strip()))
+        else:
+            raise ValueError(f"Unsupported record file type: {ext}")
+    except Exception:
+        f.close()
+        raise
+
+    def chunks():
+        with f:
+            chunk = {'series': [], 'period': [], 'pv': [], 'ev': []}
+            for series, period, pv, ev in records:
+                chunk['series'].append(str(series))
+                chunk['period'].append(int(period))
+                chunk['pv'].append(_parse_value(pv))
+                chunk['ev'].append(_parse_value(ev))
+                if len(chunk['period']) >= chunk_size:
+                    yield chunk
+                    chunk = {'series': [], 'period': [], 'pv': [], 'ev': []}
+            if chunk['period']:
+                yield chunk
+
+    return settings, chunks()
+
+
+def _project_data_from_series(settings: Dict, raw_series: Dict[str, Tuple[List, List]]) -> Dict:
+    """Assemble project data from raw PV/EV cells per series"""
+    if PROJECT_SERIES not in raw_series:
+        raise ValueError(f"No '{PROJECT_SERIES}' series in project file")
+    if 'planned_duration' not in settings:
+        raise ValueError("Project file has no planned_duration setting")
+
+    raw_pv, raw_ev = raw_series.pop(PROJECT_SERIES)
+    series = data_handler.normalize_series(raw_pv, raw_ev)
+
+    path_data = {}
+    for path_name, (path_pv, path_ev) in raw_series.items():
+        path_series = data_handler.normalize_series(path_pv, path_ev)
+        path_data[path_name] = {
+            'pv': path_series['pv'],
+            'ev': path_series['ev'],
+            'raw_pv': path_pv,
+            'raw_ev': path_ev,
+            'downtime': np.flatnonzero(path_series['downtime']).tolist(),
+            'stopwork': np.flatnonzero(path_series['stopwork']).tolist(),
+            'pv_violations': np.flatnonzero(path_series['pv_violations']).tolist()
+        }
+
+    paths = dict(settings.get('paths') or {})
+    for path_name in path_data:
+        paths.setdefault(path_name, [])
+
+    return {
+        'pv_series': series['pv'],
+        'ev_series': series['ev'],
+        'raw_pv': raw_pv,
+        'raw_ev': raw_ev,
+        'downtime': np.flatnonzero(series['downtime']).tolist(),
+        'stopwork': np.flatnonzero(series['stopwork']).tolist(),
+        'pv_violations': np.flatnonzero(series['pv_violations']).tolist(),
+        'planned_duration': float(settings['planned_duration']),
+        'start_date': _parse_start_date(settings.get('start_date')),
+        'paths': paths,
+        'path_data': path_data,
+        'network': None,
+        'task_data': None
+    }
+
+
+def load_record_file(filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """
+    Load project data from a CSV or JSON Lines record file.
+
+    Args:
+        filename: Path to a .csv or .jsonl file
+        chunk_size: Number of records read per chunk
+
+    Returns:
+        Dictionary containing project data
+    """
+    settings, chunks = iter_record_chunks(filename, chunk_size)
+
+    # Convert each chunk to compact arrays as it is read; only one chunk of
+    # Python objects is alive at a time
+    codes = {}  # Series name -> integer code
+    parts = []
+    for chunk in chunks:
+        parts.append((
+            np.array([codes.setdefault(name, len(codes)) for name in chunk['series']], dtype=np.int32),
+            np.array(chunk['period'], dtype=np.int64),
+            *_cell_arrays(chunk['pv']),
+            *_cell_arrays(chunk['ev'])))
+    if not parts:
+        return _project_data_from_series(settings, {})
+    series, periods, pv, pv_kind, ev, ev_kind = (np.concatenate(column) for column in zip(*parts))
+    del parts
+
+    order = np.lexsort((periods, series))
+    series, periods = series[order], periods[order]
+    starts = np.flatnonzero(np.r_[True, series[1:] != series[:-1]])
+    ends = np.r_[starts[1:], len(series)]
+
+    names = list(codes)
+    raw_series = {}
+    for start, end in zip(starts, ends):
+        name = names[series[start]]
+        if not np.array_equal(periods[start:end], np.arange(end - start)):
+            raise ValueError(f"Series {name} must have consecutive periods starting at 0")
+        rows = order[start:end]
+        raw_series[name] = (_raw_cells(pv[rows], pv_kind[rows]), _raw_cells(ev[rows], ev_kind[rows]))
+
+    return _project_data_from_series(settings, raw_series)
+
+
+# Kinds of PV/EV cells in the compact record arrays
+VALUE, MARKER, BLANK = 0, 1, 2
+
+
+def _cell_arrays(cells: List) -> Tuple[np.ndarray, np.ndarray]:
+    """Split parsed PV or EV cells into a float array and a cell-kind array"""
+    kinds = np.array([MARKER if cell == "XX" else BLANK if cell is None else VALUE for cell in cells],
+                     dtype=np.int8)
+    values = np.array([np.nan if kind else cell for cell, kind in zip(cells, kinds.tolist())], dtype=float)
+    return values, kinds
+
+
+def _raw_cells(values: np.ndarray, kinds: np.ndarray) -> List:
+    """Rebuild raw cells ("XX" markers, None for blanks) from _cell_arrays output"""
+    raw = values.astype(object)
+    raw[kinds == MARKER] = "XX"
+    raw[kinds == BLANK] = None
+    return raw.tolist()
+
+
+def load_npz_file(filename: str) -> Dict:
+    """
+    Load project data from a NumPy .npz file written by save_project_npz.
+
+    Args:
+        filename: Path to a .npz file
+
+    Returns:
+        Dictionary containing project data
+    """
+    with np.load(filename, allow_pickle=False) as npz:
+        settings = json.loads(str(npz['settings']))
+        path_names = settings['path_names']
+        raw_series = {PROJECT_SERIES: _raw_from_arrays(npz['pv'], npz['ev'], npz['downtime'], npz['stopwork'])}
+        for row, name in enumerate(path_names):
+            pv_length, ev_length = settings['path_lengths'][row]
+            raw_series[name] = _raw_from_arrays(
+                npz['path_pv'][row, :pv_length], npz['path_ev'][row, :ev_length],
+                npz['path_downtime'][row, :pv_length], npz['path_stopwork'][row, :ev_length])
+
+    return _project_data_from_series(settings, raw_series)
+
+
+def _raw_from_arrays(pv: np.ndarray, ev: np.ndarray, downtime: np.ndarray,
+                     stopwork: np.ndarray) -> Tuple[List, List]:
+    """Rebuild raw cells with "XX" markers from value arrays and marker masks"""
+    raw_pv = np.where(downtime, "XX", pv.astype(object)).tolist()
+    raw_ev = np.where(stopwork, "XX", ev.astype(object)).tolist()
+    return raw_pv, raw_ev
+
+
+def save_project_npz(project_data: Dict, filename: str) -> None:
+    """
+    Save project data as a NumPy .npz file readable by load_npz_file.
+
+    Args:
+        project_data: Dictionary of project data
+        filename: Output .npz path
+    """
+    def mask(indices, length):
+        result = np.zeros(length, dtype=bool)
+        result[list(indices)] = True
+        return result
+
+    path_names = list(project_data['path_data'])
+    path_lengths = [(len(project_data['path_data'][p]['pv']), len(project_data['path_data'][p]['ev']))
+                    for p in path_names]
+    width = max((max(lengths) for lengths in path_lengths), default=0)
+    arrays = {
+        'path_pv': np.full((len(path_names), width), np.nan),
+        'path_ev': np.full((len(path_names), width), np.nan),
+        'path_downtime': np.zeros((len(path_names), width), dtype=bool),
+        'path_stopwork': np.zeros((len(path_names), width), dtype=bool),
+    }
+    for row, name in enumerate(path_names):
+        data = project_data['path_data'][name]
+        pv_length, ev_length = path_lengths[row]
+        arrays['path_pv'][row, :pv_length] = data['pv']
+        arrays['path_ev'][row, :ev_length] = data['ev']
+        arrays['path_downtime'][row, :pv_length] = mask(data.get('downtime', []), pv_length)
+        arrays['path_stopwork'][row, :ev_length] = mask(data.get('stopwork', []), ev_length)
+
+    start_date = project_data['start_date']
+    settings = {
+        'planned_duration': project_data['planned_duration'],
+        'start_date': start_date.isoformat() if isinstance(start_date, datetime) else start_date,
+        'paths': project_data['paths'],
+        'path_names': path_names,
+        'path_lengths': path_lengths
+    }
+
+    num_periods = len(project_data['pv_series'])
+    np.savez(filename,
+             settings=np.array(json.dumps(settings)),
+             pv=np.asarray(project_data['pv_series'], dtype=float),
+             ev=np.asarray(project_data['ev_series'], dtype=float),
+             downtime=mask(project_data['downtime'], num_periods),
+             stopwork=mask(project_data['stopwork'], num_periods),
+             **arrays)
+
+
+LOADERS = {
+    '.xlsx': data_handler.load_project_data,
+    '.csv': load_record_file,
+    '.jsonl': load_record_file,
+    '.npz': load_npz_file,
+}
+
+
+def load_project_file(filename: str) -> Dict:
+    """
+    Load project data from any supported input format, chosen by file extension.
+
+    Args:
+        filename: Path to a .xlsx, .csv, .jsonl or .npz file
+
+    Returns:
+        Dictionary containing project data
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in LOADERS:
+        raise ValueError(f"Unsupported project file type: {ext}")
+    return LOADERS[ext](filename)
+
+
+def load_directory(directory: str) -> Tuple[Dict[str, Dict], Dict[str, str]]:
+    """
+    Bulk-load every supported project file in a directory.
+
+    A file that fails to load does not stop the others.
+
+    Args:
+        directory: Directory containing project files
+
+    Returns:
+        Tuple of (project name to project data, project name to error message);
+        project names are the file names without extension
+    """
+    projects = {}
+    errors = {}
+    for entry in sorted(os.listdir(directory)):
+        path = os.path.join(directory, entry)
+        name, ext = os.path.splitext(entry)
+        if not os.path.isfile(path) or ext.lower() not in LOADERS or entry.startswith('~$'):
+            continue
+        try:
+            projects[name] = load_project_file(path)
+        except Exception as e:
+            errors[name] = str(e)
+    return projects, errors
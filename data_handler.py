@@ -1,77 +1,88 @@
 """Functions for loading and processing project data from Excel."""
 import openpyxl
 import os
+import numpy as np
+from scipy import sparse
+import network
 from typing import Dict, List, Tuple, Union, Optional
 
 
-def load_project_data(filename: str) -> Dict:
+def load_project_data(filename, network_float_threshold: float = 0.0,
+                      streaming: bool = True) -> Dict:
     """
     Load project data from Excel file.
     
+    Paths come from the 'Paths' sheet. Without one, they are derived from an
+    activity network in a 'Network' sheet (see network.read_network_sheet).
+    
     Args:
-        filename: Path to Excel file
+        filename: Path to Excel file (or a binary file-like object)
+        network_float_threshold: Total float threshold for near-critical
+                                 paths derived from a 'Network' sheet
+        streaming: Open the workbook in read-only, values-only mode and read
+                   the sheets row by row instead of loading the full object model
     
     Returns:
         Dictionary containing project data
     """
-    wb = openpyxl.load_workbook(filename)
-    data_sheet = wb['Data Entry']
-    
-    # Read PV and EV columns
+    wb = openpyxl.load_workbook(filename, read_only=streaming, data_only=streaming)
+    try:
+        return _read_project_workbook(wb, network_float_threshold)
+    finally:
+        if streaming:
+            wb.close()  # Read-only workbooks keep the file open until closed
+
+
+def _read_series_columns(sheet) -> Tuple[List, List]:
+    """Read the raw PV (column B) and EV (column C) cells from row 4 until both are empty"""
     pv_series = []
     ev_series = []
     
-    for row in data_sheet.iter_rows(min_row=4, min_col=2, max_col=3, values_only=True):
+    for row in sheet.iter_rows(min_row=4, min_col=2, max_col=3, values_only=True):
         pv, ev = row
         if pv is None and ev is None:
             break  # stop at end of data
         pv_series.append(pv)
         ev_series.append(ev)
     
+    return pv_series, ev_series
+
+
+def _read_project_workbook(wb, network_float_threshold: float) -> Dict:
+    """Read project data from an open workbook (see load_project_data)"""
+    data_sheet = wb['Data Entry']
+    
+    # Read PV and EV columns
+    pv_series, ev_series = _read_series_columns(data_sheet)
+    
     # Get planned duration and start date
     planned_duration = data_sheet['E16'].value  
     start_date = data_sheet['E4'].value  
     
     # Process special markers
-    pv_processed = []
-    ev_processed = []
-    downtime_periods = []  # Periods where PV="XX" (planned downtime)
-    stopwork_periods = []  # Periods where EV="XX" (work stoppage)
-    
-    last_ev = 0.0
-    
-    for i, (pv, ev) in enumerate(zip(pv_series, ev_series)):
-        # Handle PV
-        if pv == "XX":
-            pv_value = 0.0  # No planned work
-            downtime_periods.append(i)
-        else:
-            pv_value = float(pv)
-        
-        # Handle EV
-        if ev == "XX":
-            ev_value = last_ev  # No progress, use last EV
-            stopwork_periods.append(i)
-        else:
-            ev_value = float(ev)
-            last_ev = ev_value
-        
-        pv_processed.append(pv_value)
-        ev_processed.append(ev_value)
+    series = normalize_series(pv_series, ev_series)
+    downtime_periods = np.flatnonzero(series['downtime']).tolist()  # Periods where PV="XX" (planned downtime)
+    stopwork_periods = np.flatnonzero(series['stopwork']).tolist()  # Periods where EV="XX" (work stoppage)
     
     # Load path data if available
     paths = {}
-    try:
+    network_result = None
+    if 'Network' in wb.sheetnames and 'Paths' not in wb.sheetnames:
+        # Derive near-critical paths from the activity network instead of a path list
+        durations, predecessors = network.read_network_sheet(wb['Network'])
+        network_result = network.analyze_network(durations, predecessors)
+        paths = network.near_critical_paths(network_result, network_float_threshold)
+    elif 'Paths' in wb.sheetnames:
         paths_sheet = wb['Paths']
         # Read path definitions - format depends on your actual data structure
-        for row in paths_sheet.iter_rows(min_row=2, values_only=True):
+        for row in paths_sheet.iter_rows(min_row=2, max_col=2, values_only=True):
             if not row[0]:  # Skip empty rows
                 continue
             path_name = row[0]
             path_tasks = row[1].split('-') if row[1] else []
             paths[path_name] = path_tasks
-    except:
-        # No paths sheet or other issue - for demo we'll create some sample paths
+    else:
+        # No paths sheet - for demo we'll create some sample paths
         paths = {
             "Path1-4-8-10": ["1", "4", "8", "10"],
             "Path2-4-8-10": ["2", "4", "8", "10"],
@@ -82,62 +93,213 @@ def load_project_data(filename: str) -> Dict:
     # Try to load path-specific PV/EV if available
     path_data = {}
     for path_name in paths:
-        try:
-            path_sheet = wb[path_name]
-            path_pv = []
-            path_ev = []
-            for row in path_sheet.iter_rows(min_row=4, min_col=2, max_col=3, values_only=True):
-                if row[0] is None and row[1] is None:
-                    break
-                path_pv.append(row[0])
-                path_ev.append(row[1])
-            
-            # Process special markers for path data
-            path_pv_processed = []
-            path_ev_processed = []
-            last_path_ev = 0.0
-            
-            for pv, ev in zip(path_pv, path_ev):
-                # Handle PV
-                if pv == "XX":
-                    pv_value = 0.0
-                else:
-                    pv_value = float(pv)
-                
-                # Handle EV
-                if ev == "XX":
-                    ev_value = last_path_ev
-                else:
-                    ev_value = float(ev)
-                    last_path_ev = ev_value
-                
-                path_pv_processed.append(pv_value)
-                path_ev_processed.append(ev_value)
-                
-            path_data[path_name] = {
-                'pv': path_pv_processed,
-                'ev': path_ev_processed,
-                'raw_pv': path_pv,
-                'raw_ev': path_ev
-            }
-        except:
-            # No sheet for this path, we'll simulate it later
-            pass
+        if path_name not in wb.sheetnames:
+            continue  # No sheet for this path, we'll simulate it later
+        
+        path_pv, path_ev = _read_series_columns(wb[path_name])
+        path_series = normalize_series(path_pv, path_ev)
+        
+        path_data[path_name] = {
+            'pv': path_series['pv'],
+            'ev': path_series['ev'],
+            'raw_pv': path_pv,
+            'raw_ev': path_ev,
+            'downtime': np.flatnonzero(path_series['downtime']).tolist(),
+            'stopwork': np.flatnonzero(path_series['stopwork']).tolist(),
+            'pv_violations': np.flatnonzero(path_series['pv_violations']).tolist()
+        }
+    
+    # Sum task-level PV/EV into the remaining paths if the workbook has task data
+    task_data = read_task_sheets(wb)
+    if task_data is not None:
+        missing_paths = {name: tasks for name, tasks in paths.items() if name not in path_data}
+        path_data.update(aggregate_path_data(missing_paths, task_data))
     
     return {
-        'pv_series': pv_processed,
-        'ev_series': ev_processed,
+        'pv_series': series['pv'],
+        'ev_series': series['ev'],
         'raw_pv': pv_series,
         'raw_ev': ev_series,
         'downtime': downtime_periods,
         'stopwork': stopwork_periods,
+        'pv_violations': np.flatnonzero(series['pv_violations']).tolist(),
         'planned_duration': planned_duration,
         'start_date': start_date,
         'paths': paths,
-        'path_data': path_data
+        'path_data': path_data,
+        'network': network_result,
+        'task_data': task_data
     }
 
 
+def _forward_fill(values: np.ndarray, fill_mask: np.ndarray, initial: float = 0.0) -> np.ndarray:
+    """
+    Replace masked entries with the last unmasked value along the last axis.
+    
+    Masked entries before any unmasked value become `initial`.
+    """
+    positions = np.where(fill_mask, -1, np.arange(values.shape[-1]))
+    positions = np.maximum.accumulate(positions, axis=-1)
+    filled = np.take_along_axis(values, np.maximum(positions, 0), axis=-1)
+    return np.where(positions < 0, initial, filled)
+
+
+def normalize_series(raw_pv, raw_ev) -> Dict[str, np.ndarray]:
+    """
+    Convert raw PV/EV cells to float arrays and handle the "XX" markers.
+    
+    PV="XX" marks planned downtime and counts as 0. EV="XX" marks a work
+    stoppage and repeats the last EV (0 before any EV). Works on single
+    series or on equally long series stacked along the first axis.
+    
+    Args:
+        raw_pv: Raw cumulative PV cells
+        raw_ev: Raw cumulative EV cells
+    
+    Returns:
+        Dictionary with float arrays 'pv' and 'ev' and boolean masks
+        'downtime', 'stopwork' and 'pv_violations' (cumulative PV below the
+        previous non-downtime PV)
+    """
+    pv_cells = np.array(raw_pv, dtype=object)
+    ev_cells = np.array(raw_ev, dtype=object)
+    downtime = pv_cells == "XX"
+    stopwork = ev_cells == "XX"
+    
+    missing = np.flatnonzero(((pv_cells == None) & ~downtime) | ((ev_cells == None) & ~stopwork))
+    if len(missing):
+        raise ValueError(f"Missing PV/EV values at periods: {', '.join(map(str, missing))}")
+    
+    pv = np.where(downtime, 0.0, pv_cells).astype(float)  # No planned work
+    ev = _forward_fill(np.where(stopwork, 0.0, ev_cells).astype(float), stopwork)  # No progress, use last EV
+    
+    # Cumulative PV must not decrease; downtime periods are skipped
+    last_pv = _forward_fill(pv, downtime, initial=-np.inf)
+    previous_pv = np.concatenate([np.full(pv.shape[:-1] + (1,), -np.inf), last_pv[..., :-1]], axis=-1)
+    violations = ~downtime & (pv < previous_pv)
+    
+    return {
+        'pv': pv,
+        'ev': ev,
+        'downtime': downtime,
+        'stopwork': stopwork,
+        'pv_violations': violations
+    }
+
+
+def _read_task_sheet(sheet) -> Tuple[List[str], np.ndarray]:
+    """
+    Read a wide task sheet: task IDs in row 1 from column B, one period per row below.
+    
+    Blank cells count as 0 and "XX" repeats the task's previous cumulative value.
+    
+    Returns:
+        Tuple of (task IDs, tasks x periods matrix of cumulative values)
+    """
+    rows = sheet.iter_rows(values_only=True)
+    header = next(rows, ())
+    task_ids = [network.normalize_activity_id(task) for task in header[1:] if task is not None]
+    
+    columns = []
+    for row in rows:
+        values = tuple(row[1:len(task_ids) + 1])
+        if all(v is None for v in values):
+            break  # stop at end of data
+        columns.append(values + (None,) * (len(task_ids) - len(values)))
+    
+    cells = np.empty((len(task_ids), len(columns)), dtype=object)
+    if columns:
+        cells[:] = np.array(columns, dtype=object).T
+    markers = cells == "XX"
+    values = np.where(markers | (cells == None), 0.0, cells).astype(float)
+    
+    return task_ids, _forward_fill(values, markers)
+
+
+def read_task_sheets(wb) -> Optional[Dict]:
+    """
+    Read task-level cumulative PV/EV from 'Task PV' and 'Task EV' sheets.
+    
+    Args:
+        wb: openpyxl workbook
+    
+    Returns:
+        Dictionary with 'task_ids' and tasks x periods 'pv' and 'ev' matrices,
+        or None if the workbook has no task sheets
+    """
+    if 'Task PV' not in wb.sheetnames or 'Task EV' not in wb.sheetnames:
+        return None
+    
+    task_ids, task_pv = _read_task_sheet(wb['Task PV'])
+    ev_task_ids, task_ev = _read_task_sheet(wb['Task EV'])
+    if ev_task_ids != task_ids:
+        raise ValueError("'Task PV' and 'Task EV' sheets must list the same tasks in the same order")
+    
+    return {'task_ids': task_ids, 'pv': task_pv, 'ev': task_ev}
+
+
+def build_path_task_incidence(paths: Dict[str, List[str]], task_ids: List[str]) -> sparse.csr_matrix:
+    """
+    Build the sparse path x task incidence matrix for a set of paths.
+    
+    Args:
+        paths: Dictionary of path names to their task IDs
+        task_ids: Task IDs in the column order of the task matrices
+    
+    Returns:
+        CSR matrix with a 1 where a path contains a task, rows in path order
+    """
+    task_index = {task: i for i, task in enumerate(task_ids)}
+    rows = []
+    cols = []
+    
+    for row, (path_name, tasks) in enumerate(paths.items()):
+        unknown = [task for task in tasks if task not in task_index]
+        if unknown:
+            raise ValueError(f"Path {path_name} has tasks without task data: {', '.join(unknown)}")
+        for task in dict.fromkeys(tasks):  # A task counts once per path
+            rows.append(row)
+            cols.append(task_index[task])
+    
+    data = np.ones(len(rows))
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(paths), len(task_ids)))
+
+
+def aggregate_path_data(paths: Dict[str, List[str]], task_data: Dict) -> Dict[str, Dict]:
+    """
+    Sum task-level PV/EV into path PV/EV series.
+    
+    All paths are computed with one sparse incidence x task matrix product
+    per series, so tasks shared by many paths are not re-summed per path.
+    
+    Args:
+        paths: Dictionary of path names to their task IDs
+        task_data: Task data as returned by read_task_sheets
+    
+    Returns:
+        Dictionary of path names to path data in the load_project_data format
+    """
+    if not paths:
+        return {}
+    
+    incidence = build_path_task_incidence(paths, task_data['task_ids'])
+    path_pv = incidence @ task_data['pv']
+    path_ev = incidence @ task_data['ev']
+    
+    path_data = {}
+    for row, path_name in enumerate(paths):
+        pv = path_pv[row].tolist()
+        ev = path_ev[row].tolist()
+        path_data[path_name] = {
+            'pv': pv,
+            'ev': ev,
+            'raw_pv': list(pv),
+            'raw_ev': list(ev)
+        }
+    
+    return path_data
+
+
 def simulate_path_data(project_data: Dict) -> Dict:
     """
     Simulate path-specific PV/EV data if not available directly.
@@ -196,57 +358,77 @@ def simulate_path_data(project_data: Dict) -> Dict:
     return project_data
 
 
-def write_results_to_excel(project_data: Dict, results: Dict, output_file: str) -> None:
+def _path_metric_columns(path_metrics: Dict[str, List[Tuple]], paths: List[str],
+                         num_periods: int) -> np.ndarray:
+    """
+    Build the periods x (3 * paths) block of ES, SPI(t) and IEAC(t) columns.
+    
+    Periods beyond a path's history are "N/A".
+    """
+    columns = np.full((num_periods, 3 * len(paths)), "N/A", dtype=object)
+    for j, path in enumerate(paths):
+        metrics = np.asarray(path_metrics[path], dtype=float).reshape(-1, 4)[:num_periods]
+        columns[:len(metrics), 3 * j:3 * j + 3] = metrics[:, [0, 1, 3]]  # Exclude SV(t)
+    return columns
+
+
+def write_results_to_excel(project_data: Dict, results: Dict, output_file: str,
+                           max_paths_per_sheet: int = 1000) -> None:
     """
     Write analysis results back to Excel.
     
+    Uses a write-only workbook and appends whole rows, so the sheet grid is
+    streamed to disk instead of held in memory. Paths beyond
+    max_paths_per_sheet continue on additional sheets, each with its own
+    Period column.
+    
     Args:
         project_data: Dictionary of project data
         results: Dictionary of analysis results
         output_file: Path to output Excel file
+        max_paths_per_sheet: Maximum number of paths (3 columns each) per sheet
     """
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "ES Analysis Results"
-    
-    # Write headers
-    headers = ["Period", "Overall ES", "Overall SPI(t)", "Overall IEAC(t)"]
-    for path in results['path_metrics']:
-        headers.extend([f"{path} ES", f"{path} SPI(t)", f"{path} IEAC(t)"])
-    headers.append("Controlling Path")
+    wb = openpyxl.Workbook(write_only=True)
     
-    for col, header in enumerate(headers, start=1):
-        ws.cell(row=1, column=col, value=header)
+    path_names = list(results['path_metrics'])
+    num_periods = len(results['overall_metrics'])
+    controlling_path = results['controlling_path']
+    anomalies = results.get('anomalies')
+    chunks = [path_names[i:i + max_paths_per_sheet]
+              for i in range(0, len(path_names), max_paths_per_sheet)] or [[]]
     
-    # Write data
-    for period in range(len(results['overall_metrics'])):
-        row_data = [period + 1]  # 1-indexed period number
-        
-        # Overall metrics
-        row_data.extend(results['overall_metrics'][period])
+    for sheet_index, chunk in enumerate(chunks):
+        first = sheet_index == 0
+        ws = wb.create_sheet("ES Analysis Results" if first else f"ES Analysis Results {sheet_index + 1}")
         
-        # Path metrics
-        for path in results['path_metrics']:
-            if period < len(results['path_metrics'][path]):
-                row_data.extend(results['path_metrics'][path][period][:-1])  # Exclude SV(t)
-            else:
-                row_data.extend(["N/A", "N/A", "N/A"])
-        
-        # Controlling path
-        if period < len(results['controlling_path']):
-            row_data.append(results['controlling_path'][period])
-        else:
-            row_data.append("N/A")
+        # Write headers
+        headers = ["Period"]
+        if first:
+            headers.extend(["Overall ES", "Overall SPI(t)", "Overall IEAC(t)"])
+        for path in chunk:
+            headers.extend([f"{path} ES", f"{path} SPI(t)", f"{path} IEAC(t)"])
+        if first:
+            headers.append("Controlling Path")
+            if anomalies is not None:
+                headers.append("Anomalies")
+        ws.append(headers)
         
-        # Write row
-        for col, value in enumerate(row_data, start=1):
-            ws.cell(row=period+2, column=col, value=value)
-    
-    # Add anomalies if identified
-    if 'anomalies' in results:
-        ws.cell(row=1, column=len(headers)+1, value="Anomalies")
-        for period, anomaly in results['anomalies'].items():
-            ws.cell(row=int(period)+2, column=len(headers)+1, 
-                    value=f"{anomaly[0]} (IEAC={anomaly[1]:.2f})")
+        # Write data
+        path_columns = _path_metric_columns(results['path_metrics'], chunk, num_periods).tolist()
+        for period in range(num_periods):
+            row_data = [period + 1]  # 1-indexed period number
+            
+            if first:
+                row_data.extend(results['overall_metrics'][period])
+            
+            row_data.extend(path_columns[period])
+            
+            if first:
+                row_data.append(controlling_path[period] if period < len(controlling_path) else "N/A")
+                if anomalies is not None:
+                    anomaly = anomalies.get(period)
+                    row_data.append(f"{anomaly[0]} (IEAC={anomaly[1]:.2f})" if anomaly else None)
+            
+            ws.append(row_data)
     
     wb.save(output_file)
@@ -2,25 +2,129 @@
 import sqlite3
 import os
 import json
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import chain, groupby
 from typing import Dict, List, Any, Optional
 
+# Connection settings: WAL lets readers proceed during a write, and with WAL
+# synchronous=NORMAL is still safe against corruption while avoiding an fsync
+# per transaction. A negative cache_size is in KiB.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Insert statements shared by the write methods
+INSERT_PROJECT_SQL = """
+INSERT INTO projects (name, planned_duration, start_date, created_at, excel_file)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+INSERT_ANALYSIS_SQL = """
+INSERT INTO analyses
+(project_id, analysis_date, num_periods, final_es, final_spi_t, final_ieac_t,
+ controlling_path, has_anomalies, input_hash)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_PERIOD_SQL = """
+INSERT INTO periods
+(analysis_id, period_num, overall_es, overall_spi_t, overall_ieac_t,
+ controlling_path, is_anomaly)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_PATH_SQL = "INSERT OR IGNORE INTO paths (project_id, name) VALUES (?, ?)"
+
+INSERT_PATH_METRICS_SQL = """
+INSERT INTO path_period_metrics (analysis_id, path_id, period_num, es, spi_t, sv_t, ieac_t)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Multi-row form for one block of a path's periods: ?1 and ?2 bind the analysis
+# and path IDs once, and the period numbers are literals
+INSERT_PATH_METRICS_BLOCK_SQL = """
+INSERT INTO path_period_metrics (analysis_id, path_id, period_num, es, spi_t, sv_t, ieac_t)
+VALUES {rows}
+"""
+
+# Periods per block; 2 + 4 * 200 parameters stay under SQLite's old default limit of 999
+PATH_METRICS_BLOCK = 200
+
+# Schema version recorded in PRAGMA user_version once the migrations up to it have run
+SCHEMA_VERSION = 2
+
 
 class ESDatabase:
-    """SQLite database for Earned Schedule analysis results"""
+    """
+    SQLite database for Earned Schedule analysis results.
     
-    def __init__(self, db_path: str = "es_analysis.db"):
-        """Initialize database connection"""
+    Safe to share between threads: each thread gets its own connection
+    (and cursor) on first use. Writers take the write lock up front and, in
+    WAL mode, readers keep reading the last committed state while a write
+    is in progress. Each thread closes its own connection with close() or
+    session(). An in-memory database (":memory:") can only be used from the
+    thread that created it, since every connection would get an empty one.
+    """
+    
+    def __init__(self, db_path: str = "es_analysis.db", timeout: float = 30.0):
+        """Initialize database connection (timeout: seconds to wait for another writer's lock)"""
         self.db_path = db_path
-        self.conn = None
-        self.cursor = None
+        self.timeout = timeout
+        self._local = threading.local()
+        self._owner = threading.get_ident()
         self.initialize_db()
     
+    def _connect(self) -> sqlite3.Connection:
+        """Open and configure a new connection for the calling thread"""
+        if self.db_path == ":memory:" and threading.get_ident() != self._owner:
+            raise ValueError("An in-memory database can only be used from the thread that created it")
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        deadline = time.monotonic() + self.timeout
+        for pragma in PRAGMAS:
+            # Switching a new file to WAL needs it to itself and fails at once,
+            # without waiting for the timeout, while other processes open it too
+            while True:
+                try:
+                    conn.execute(pragma)
+                    break
+                except sqlite3.OperationalError:
+                    if time.monotonic() >= deadline:
+                        raise
+                    time.sleep(0.01)
+        self._local.conn = conn
+        self._local.cursor = conn.cursor()
+        self._local.transaction_depth = 0
+        return conn
+    
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """The calling thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        return conn if conn is not None else self._connect()
+    
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        """The calling thread's cursor"""
+        self.conn
+        return self._local.cursor
+    
+    @property
+    def _transaction_depth(self) -> int:
+        self.conn
+        return self._local.transaction_depth
+    
+    @_transaction_depth.setter
+    def _transaction_depth(self, value: int) -> None:
+        self._local.transaction_depth = value
+    
     def initialize_db(self) -> None:
         """Create database and tables if they don't exist"""
-        self.conn = sqlite3.connect(self.db_path)
-        self.cursor = self.conn.cursor()
-        
         # Create projects table
         self.cursor.execute("""
         CREATE TABLE IF NOT EXISTS projects (
@@ -45,6 +149,7 @@ class ESDatabase:
             final_ieac_t REAL,
             controlling_path TEXT,
             has_anomalies INTEGER,
+            input_hash TEXT,
             FOREIGN KEY (project_id) REFERENCES projects(id)
         )
         """)
@@ -59,18 +164,114 @@ class ESDatabase:
             overall_spi_t REAL,
             overall_ieac_t REAL,
             controlling_path TEXT,
-            path_metrics TEXT,  -- JSON string of path metrics
+            path_metrics TEXT,  -- Legacy JSON string of path metrics, migrated to path_period_metrics
             is_anomaly INTEGER,
             FOREIGN KEY (analysis_id) REFERENCES analyses(id)
         )
         """)
         
+        # Create paths dimension table
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS paths (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            project_id INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            UNIQUE (project_id, name),
+            FOREIGN KEY (project_id) REFERENCES projects(id)
+        )
+        """)
+        
+        # Create per-path, per-period metrics table
+        self.cursor.execute("""
+        CREATE TABLE IF NOT EXISTS path_period_metrics (
+            analysis_id INTEGER NOT NULL,
+            path_id INTEGER NOT NULL,
+            period_num INTEGER NOT NULL,
+            es REAL,
+            spi_t REAL,
+            sv_t REAL,
+            ieac_t REAL,
+            PRIMARY KEY (analysis_id, path_id, period_num),
+            FOREIGN KEY (analysis_id) REFERENCES analyses(id),
+            FOREIGN KEY (path_id) REFERENCES paths(id)
+        ) WITHOUT ROWID
+        """)
+        
+        # path_period_metrics needs no secondary index: its primary key serves both
+        # path histories (a key range) and period cross-sections (one key lookup
+        # per path). analyses are read per project in date order by the window
+        # functions of the portfolio queries.
+        self.cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_analyses_project_date
+        ON analyses (project_id, analysis_date, id)
+        """)
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_periods_analysis ON periods (analysis_id, period_num)")
+        
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_projects_name ON projects (name)")
+        
         self.conn.commit()
+        self._migrate()
     
     def close(self) -> None:
-        """Close database connection"""
-        if self.conn:
-            self.conn.close()
+        """Close the calling thread's connection (a later call opens a new one)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+    
+    @contextmanager
+    def session(self):
+        """
+        Scope the calling thread's connection to a block.
+        
+        The connection is closed when the block exits, unless the thread
+        already had one open, so short-lived worker threads do not leave
+        connections behind.
+        """
+        was_open = getattr(self._local, 'conn', None) is not None
+        try:
+            yield self
+        finally:
+            if not was_open:
+                self.close()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes into a single transaction, committed when the block exits
+        and rolled back if it raises.
+        
+        Nested blocks become savepoints, so an inner failure only undoes the
+        inner block's writes.
+        """
+        savepoint = f"sp{self._transaction_depth}"
+        if self._transaction_depth == 0:
+            # IMMEDIATE takes the write lock now (waiting up to timeout), instead of
+            # failing with "database is locked" when a read turns into a write
+            self.conn.execute("BEGIN IMMEDIATE")
+        else:
+            self.conn.execute(f"SAVEPOINT {savepoint}")
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                self.conn.rollback()
+            else:
+                self.conn.execute(f"ROLLBACK TO {savepoint}")
+                self.conn.execute(f"RELEASE {savepoint}")
+            raise
+        self._transaction_depth -= 1
+        if self._transaction_depth == 0:
+            self.conn.commit()
+        else:
+            self.conn.execute(f"RELEASE {savepoint}")
+    
+    def _commit(self) -> None:
+        """Commit unless the writes belong to an open transaction() block"""
+        if self._transaction_depth == 0:
+            self.conn.commit()
     
     def add_project(self, name: str, planned_duration: float, 
                    start_date: Optional[datetime] = None,
@@ -79,74 +280,195 @@ class ESDatabase:
         created_at = datetime.now().isoformat()
         start_date_str = start_date.isoformat() if start_date else None
         
-        self.cursor.execute("""
-        INSERT INTO projects (name, planned_duration, start_date, created_at, excel_file)
-        VALUES (?, ?, ?, ?, ?)
-        """, (name, planned_duration, start_date_str, created_at, excel_file))
+        self.cursor.execute(INSERT_PROJECT_SQL,
+                            (name, planned_duration, start_date_str, created_at, excel_file))
         
-        self.conn.commit()
+        self._commit()
         return self.cursor.lastrowid
     
-    def add_analysis(self, project_id: int, results: Dict) -> int:
-        """Add analysis results to the database"""
+    def _path_ids(self, project_id: int, path_names) -> Dict[str, int]:
+        """Get the paths table IDs of a project's paths, adding any new paths"""
+        self.cursor.executemany(INSERT_PATH_SQL, ((project_id, name) for name in path_names))
+        self.cursor.execute("SELECT name, id FROM paths WHERE project_id = ?", (project_id,))
+        return dict(self.cursor.fetchall())
+    
+    def _insert_path_metrics(self, analysis_id: int, path_ids: Dict[str, int],
+                             path_metrics: Dict[str, List]) -> None:
+        """
+        Insert (ES, SPI(t), SV(t), IEAC(t)) rows per path and period.
+        
+        Each statement writes PATH_METRICS_BLOCK periods of one path, which
+        binds far fewer parameters than one executemany row per cell.
+        """
+        statements = {}  # (first period, number of periods) -> SQL
+        # Insert in primary key order so rows append to the table's B-tree
+        for path in sorted(path_metrics, key=path_ids.__getitem__):
+            metrics = path_metrics[path]
+            for start in range(0, len(metrics), PATH_METRICS_BLOCK):
+                block = metrics[start:start + PATH_METRICS_BLOCK]
+                sql = statements.get((start, len(block)))
+                if sql is None:
+                    sql = statements[start, len(block)] = INSERT_PATH_METRICS_BLOCK_SQL.format(rows=", ".join(
+                        f"(?1, ?2, {period}, ?, ?, ?, ?)" for period in range(start, start + len(block))))
+                self.cursor.execute(sql, (analysis_id, path_ids[path], *chain.from_iterable(m[:4] for m in block)))
+    
+    def add_analysis(self, project_id: int, results: Dict, input_hash: Optional[str] = None) -> int:
+        """
+        Add analysis results to the database.
+        
+        The analysis row, the period rows and the per-path metrics rows are
+        written in one transaction: the first two with an executemany each,
+        the path metrics in multi-row blocks (see _insert_path_metrics).
+        input_hash identifies the analysed input and parameters for find_analysis.
+        """
         analysis_date = datetime.now().isoformat()
-        num_periods = len(results['overall_metrics'])
+        overall_metrics = results['overall_metrics']
+        controlling_paths = results['controlling_path']
+        anomalies = results.get('anomalies', {})
+        num_periods = len(overall_metrics)
         
         # Get final metrics
-        final_es = results['overall_metrics'][-1][0]
-        final_spi_t = results['overall_metrics'][-1][1]
-        final_ieac_t = results['overall_metrics'][-1][2]
+        final_es, final_spi_t, final_ieac_t = overall_metrics[-1][:3]
         
         # Get final controlling path
-        controlling_path = results['controlling_path'][-1] if results['controlling_path'] else None
+        controlling_path = controlling_paths[-1] if controlling_paths else None
         
         # Check if there are anomalies
-        has_anomalies = 1 if results.get('anomalies') else 0
-        
-        self.cursor.execute("""
-        INSERT INTO analyses 
-        (project_id, analysis_date, num_periods, final_es, final_spi_t, final_ieac_t, 
-         controlling_path, has_anomalies)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (project_id, analysis_date, num_periods, final_es, final_spi_t, final_ieac_t,
-              controlling_path, has_anomalies))
-        
-        analysis_id = self.cursor.lastrowid
+        has_anomalies = 1 if anomalies else 0
         
-        # Add period-by-period data
-        for period in range(num_periods):
-            overall_es = results['overall_metrics'][period][0]
-            overall_spi_t = results['overall_metrics'][period][1]
-            overall_ieac_t = results['overall_metrics'][period][2]
+        with self.transaction():
+            self.cursor.execute(INSERT_ANALYSIS_SQL, (
+                project_id, analysis_date, num_periods, final_es, final_spi_t, final_ieac_t,
+                controlling_path, has_anomalies, input_hash))
+            analysis_id = self.cursor.lastrowid
             
-            # Get controlling path for this period
-            period_controlling_path = results['controlling_path'][period] if period < len(results['controlling_path']) else None
+            self.cursor.executemany(INSERT_PERIOD_SQL, (
+                (analysis_id, period, overall_es, overall_spi_t, overall_ieac_t,
+                 controlling_paths[period] if period < len(controlling_paths) else None,
+                 1 if period in anomalies else 0)
+                for period, (overall_es, overall_spi_t, overall_ieac_t) in enumerate(overall_metrics)))
             
-            # Collect path metrics for this period
-            path_metrics = {}
-            for path, metrics in results['path_metrics'].items():
-                if period < len(metrics):
-                    path_metrics[path] = {
-                        'es': metrics[period][0],
-                        'spi_t': metrics[period][1],
-                        'sv_t': metrics[period][2],
-                        'ieac_t': metrics[period][3]
-                    }
-            
-            # Check if this period has an anomaly
-            is_anomaly = 1 if period in results.get('anomalies', {}) else 0
-            
-            self.cursor.execute("""
-            INSERT INTO periods 
-            (analysis_id, period_num, overall_es, overall_spi_t, overall_ieac_t,
-             controlling_path, path_metrics, is_anomaly)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (analysis_id, period, overall_es, overall_spi_t, overall_ieac_t,
-                  period_controlling_path, json.dumps(path_metrics), is_anomaly))
+            path_ids = self._path_ids(project_id, results['path_metrics'])
+            self._insert_path_metrics(analysis_id, path_ids, results['path_metrics'])
         
-        self.conn.commit()
         return analysis_id
     
+    def _migrate(self) -> None:
+        """Run the migrations this database has not had yet, once"""
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        with self.transaction():
+            # Read again under the write lock, another connection may have migrated meanwhile
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                self._migrate_path_metrics()
+            if version < 2:
+                # Databases created before input_hash was part of CREATE TABLE
+                self.cursor.execute("PRAGMA table_info(analyses)")
+                if 'input_hash' not in [column[1] for column in self.cursor.fetchall()]:
+                    self.cursor.execute("ALTER TABLE analyses ADD COLUMN input_hash TEXT")
+                self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_analyses_input_hash ON analyses (input_hash)")
+            if version < SCHEMA_VERSION:
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    
+    def _migrate_path_metrics(self) -> None:
+        """Move path metrics from legacy JSON period rows into path_period_metrics"""
+        self.cursor.execute("""
+        SELECT DISTINCT p.analysis_id, a.project_id FROM periods p
+        JOIN analyses a ON a.id = p.analysis_id
+        WHERE p.path_metrics IS NOT NULL
+        """)
+        for analysis_id, project_id in self.cursor.fetchall():
+            with self.transaction():
+                self.cursor.execute("""
+                SELECT period_num, path_metrics FROM periods
+                WHERE analysis_id = ? AND path_metrics IS NOT NULL
+                """, (analysis_id,))
+                path_metrics = {}
+                for period, blob in self.cursor.fetchall():
+                    for path, m in json.loads(blob).items():
+                        path_metrics.setdefault(path, {})[period] = (m['es'], m['spi_t'], m['sv_t'], m['ieac_t'])
+                
+                path_ids = self._path_ids(project_id, path_metrics)
+                self.cursor.executemany("INSERT OR IGNORE" + INSERT_PATH_METRICS_SQL.strip()[len("INSERT"):], (
+                    (analysis_id, path_ids[path], period, *m)
+                    for path, by_period in path_metrics.items()
+                    for period, m in by_period.items()))
+                self.cursor.execute("UPDATE periods SET path_metrics = NULL WHERE analysis_id = ?",
+                                    (analysis_id,))
+    
+    def find_project(self, name: str, excel_file: Optional[str] = None) -> Optional[int]:
+        """
+        Find the most recent project with a name (and input file, if given).
+        
+        Returns:
+            Project ID, or None if there is no such project
+        """
+        self.cursor.execute("""
+        SELECT id FROM projects
+        WHERE name = ? AND (? IS NULL OR excel_file = ?)
+        ORDER BY id DESC LIMIT 1
+        """, (name, excel_file, excel_file))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+    
+    def find_analysis(self, input_hash: str, project_id: Optional[int] = None) -> Optional[int]:
+        """
+        Find the most recent analysis of the same input and parameters
+        (within one project, if given).
+        
+        Returns:
+            Analysis ID, or None if there is no such analysis
+        """
+        self.cursor.execute("""
+        SELECT id FROM analyses
+        WHERE input_hash = ? AND (? IS NULL OR project_id = ?)
+        ORDER BY id DESC LIMIT 1
+        """, (input_hash, project_id, project_id))
+        row = self.cursor.fetchone()
+        return row[0] if row else None
+    
+    def get_analysis_results(self, analysis_id: int) -> Dict:
+        """
+        Get the stored metrics of an analysis in the layout of analysis results.
+        
+        Returns:
+            Dictionary with project_id, input_hash, overall_metrics (list of
+            (ES, SPI(t), IEAC(t))), path_metrics (path name to list of
+            (ES, SPI(t), SV(t), IEAC(t))), controlling_path (list of path names)
+            and anomaly_periods (set of period numbers)
+        """
+        self.cursor.execute("SELECT project_id, input_hash FROM analyses WHERE id = ?", (analysis_id,))
+        row = self.cursor.fetchone()
+        if row is None:
+            raise ValueError(f"No analysis with ID {analysis_id}")
+        project_id, input_hash = row
+        
+        self.cursor.execute("""
+        SELECT overall_es, overall_spi_t, overall_ieac_t, controlling_path, is_anomaly
+        FROM periods WHERE analysis_id = ? ORDER BY period_num
+        """, (analysis_id,))
+        periods = self.cursor.fetchall()
+        
+        self.cursor.execute("""
+        SELECT p.name, m.es, m.spi_t, m.sv_t, m.ieac_t
+        FROM path_period_metrics m JOIN paths p ON p.id = m.path_id
+        WHERE m.analysis_id = ?
+        ORDER BY m.path_id, m.period_num
+        """, (analysis_id,))
+        path_metrics = {}
+        for name, es, spi_t, sv_t, ieac_t in self.cursor.fetchall():
+            path_metrics.setdefault(name, []).append((es, spi_t, sv_t, ieac_t))
+        
+        return {
+            'project_id': project_id,
+            'input_hash': input_hash,
+            'overall_metrics': [tuple(row[:3]) for row in periods],
+            'path_metrics': path_metrics,
+            'controlling_path': [row[3] for row in periods],
+            'anomaly_periods': {period for period, row in enumerate(periods) if row[4]}
+        }
+    
     def get_projects(self) -> List[Dict]:
         """Get all projects"""
         self.cursor.execute("SELECT * FROM projects ORDER BY created_at DESC")
@@ -165,7 +487,7 @@ class ESDatabase:
         return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
     
     def get_periods(self, analysis_id: int) -> List[Dict]:
-        """Get all periods for an analysis"""
+        """Get all periods for an analysis, with each period's path metrics"""
         self.cursor.execute("""
         SELECT * FROM periods 
         WHERE analysis_id = ? 
@@ -173,18 +495,212 @@ class ESDatabase:
         """, (analysis_id,))
         
         columns = [col[0] for col in self.cursor.description]
-        periods = []
+        periods = [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+        by_period = {}
+        for period_dict in periods:
+            period_dict['path_metrics'] = by_period.setdefault(period_dict['period_num'], {})
+        
+        self.cursor.execute("""
+        SELECT m.period_num, p.name, m.es, m.spi_t, m.sv_t, m.ieac_t
+        FROM path_period_metrics m JOIN paths p ON p.id = m.path_id
+        WHERE m.analysis_id = ?
+        ORDER BY m.path_id
+        """, (analysis_id,))
+        for period, path, es, spi_t, sv_t, ieac_t in self.cursor.fetchall():
+            if period in by_period:
+                by_period[period][path] = {'es': es, 'spi_t': spi_t, 'sv_t': sv_t, 'ieac_t': ieac_t}
         
-        for row in self.cursor.fetchall():
-            period_dict = dict(zip(columns, row))
-            # Parse JSON string back to dictionary
-            period_dict['path_metrics'] = json.loads(period_dict['path_metrics'])
-            periods.append(period_dict)
-            
         return periods
+    
+    def get_path_history(self, analysis_id: int, path_name: str) -> List[Dict]:
+        """
+        Get one path's metrics over all periods of an analysis.
+        
+        Args:
+            analysis_id: Analysis ID
+            path_name: Path name
+        
+        Returns:
+            List of dictionaries with period_num, es, spi_t, sv_t and ieac_t, by period
+        """
+        self.cursor.execute("""
+        SELECT m.period_num, m.es, m.spi_t, m.sv_t, m.ieac_t
+        FROM path_period_metrics m
+        JOIN analyses a ON a.id = m.analysis_id
+        JOIN paths p ON p.project_id = a.project_id AND p.id = m.path_id
+        WHERE m.analysis_id = ? AND p.name = ?
+        ORDER BY m.period_num
+        """, (analysis_id, path_name))
+        
+        columns = [col[0] for col in self.cursor.description]
+        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+    
+    def get_period_metrics(self, analysis_id: int, period_num: int) -> Dict[str, Dict]:
+        """
+        Get every path's metrics in one period of an analysis.
+        
+        Args:
+            analysis_id: Analysis ID
+            period_num: Period number
+        
+        Returns:
+            Dictionary of path names to dictionaries with es, spi_t, sv_t and ieac_t
+        """
+        self.cursor.execute("""
+        SELECT p.name, m.es, m.spi_t, m.sv_t, m.ieac_t
+        FROM analyses a  -- CROSS JOIN fixes the join order: one key lookup per path
+        CROSS JOIN paths p ON p.project_id = a.project_id
+        CROSS JOIN path_period_metrics m
+          ON m.analysis_id = a.id AND m.path_id = p.id AND m.period_num = ?
+        WHERE a.id = ?
+        ORDER BY p.id
+        """, (period_num, analysis_id))
+        
+        return {name: {'es': es, 'spi_t': spi_t, 'sv_t': sv_t, 'ieac_t': ieac_t}
+                for name, es, spi_t, sv_t, ieac_t in self.cursor.fetchall()}
+    
+    def _fetch_dicts(self, query: str, params=()) -> List[Dict]:
+        """Run a query and return its rows as dictionaries"""
+        self.cursor.execute(query, params)
+        columns = [col[0] for col in self.cursor.description]
+        return [dict(zip(columns, row)) for row in self.cursor.fetchall()]
+    
+    # ORDER BY clauses of get_latest_metrics
+    PORTFOLIO_ORDER = {
+        "name": "p.name, p.id",
+        "spi_t": "r.final_spi_t IS NULL, r.final_spi_t, p.name",
+        "ieac_t": "r.final_ieac_t IS NULL, r.final_ieac_t DESC, p.name",
+    }
+    
+    def get_latest_metrics(self, limit: int = 50, offset: int = 0,
+                           order_by: str = "name") -> List[Dict]:
+        """
+        Get each project's most recent analysis, one row per project.
+        
+        Args:
+            limit: Maximum number of projects to return
+            offset: Number of projects to skip (for pagination)
+            order_by: "name", "spi_t" (worst first) or "ieac_t" (longest first)
+        
+        Returns:
+            List of dictionaries with the project's id, name and planned_duration
+            and its latest analysis_id, analysis_date, num_periods, final_es,
+            final_spi_t, final_ieac_t, controlling_path and has_anomalies
+        """
+        if order_by not in self.PORTFOLIO_ORDER:
+            raise ValueError(f"order_by must be one of: {', '.join(self.PORTFOLIO_ORDER)}")
+        
+        return self._fetch_dicts(f"""
+        WITH ranked AS (
+            SELECT a.*, ROW_NUMBER() OVER (
+                PARTITION BY a.project_id ORDER BY a.analysis_date DESC, a.id DESC) AS recency
+            FROM analyses a
+        )
+        SELECT p.id AS project_id, p.name, p.planned_duration,
+               r.id AS analysis_id, r.analysis_date, r.num_periods, r.final_es,
+               r.final_spi_t, r.final_ieac_t, r.controlling_path, r.has_anomalies
+        FROM ranked r JOIN projects p ON p.id = r.project_id
+        WHERE r.recency = 1
+        ORDER BY {self.PORTFOLIO_ORDER[order_by]}
+        LIMIT ? OFFSET ?
+        """, (limit, offset))
+    
+    def get_spi_trends(self, num_analyses: int = 5, limit: int = 50, offset: int = 0) -> List[Dict]:
+        """
+        Get the final SPI(t) of each project's last analyses.
+        
+        Args:
+            num_analyses: Number of most recent analyses per project
+            limit: Maximum number of projects to return
+            offset: Number of projects to skip (for pagination), by project name
+        
+        Returns:
+            List of dictionaries with project_id, name, spi_trend (SPI(t) values,
+            oldest first), latest_spi_t and spi_change (latest minus oldest
+            SPI(t) in the trend)
+        """
+        rows = self._fetch_dicts("""
+        WITH page AS (
+            SELECT id, name FROM projects
+            WHERE id IN (SELECT project_id FROM analyses)
+            ORDER BY name, id
+            LIMIT ? OFFSET ?
+        ),
+        recent AS (
+            SELECT a.project_id, a.analysis_date, a.id, a.final_spi_t,
+                   ROW_NUMBER() OVER (PARTITION BY a.project_id
+                                      ORDER BY a.analysis_date DESC, a.id DESC) AS recency
+            FROM analyses a JOIN page ON page.id = a.project_id
+        )
+        SELECT page.id AS project_id, page.name, r.final_spi_t
+        FROM page JOIN recent r ON r.project_id = page.id
+        WHERE r.recency <= ?
+        ORDER BY page.name, page.id, r.analysis_date, r.id
+        """, (limit, offset, num_analyses))
+        
+        trends = []
+        for project_id, project_rows in groupby(rows, key=lambda row: row['project_id']):
+            project_rows = list(project_rows)
+            spi_trend = [row['final_spi_t'] for row in project_rows]
+            known = [spi for spi in spi_trend if spi is not None]
+            trends.append({
+                'project_id': project_id,
+                'name': project_rows[0]['name'],
+                'spi_trend': spi_trend,
+                'latest_spi_t': spi_trend[-1],
+                'spi_change': known[-1] - known[0] if known else None
+            })
+        return trends
+    
+    def get_controlling_path_changes(self, limit: int = 50, offset: int = 0) -> List[Dict]:
+        """
+        Get projects whose latest analysis has a different final controlling
+        path than the analysis before it.
+        
+        Args:
+            limit: Maximum number of projects to return
+            offset: Number of projects to skip (for pagination)
+        
+        Returns:
+            List of dictionaries with project_id, name, analysis_id, analysis_date,
+            previous_path and controlling_path, most recent change first
+        """
+        return self._fetch_dicts("""
+        WITH history AS (
+            SELECT a.project_id, a.id, a.analysis_date, a.controlling_path,
+                   LAG(a.controlling_path) OVER w AS previous_path,
+                   ROW_NUMBER() OVER (PARTITION BY a.project_id
+                                      ORDER BY a.analysis_date DESC, a.id DESC) AS recency
+            FROM analyses a
+            WINDOW w AS (PARTITION BY a.project_id ORDER BY a.analysis_date, a.id)
+        )
+        SELECT p.id AS project_id, p.name, h.id AS analysis_id, h.analysis_date,
+               h.previous_path, h.controlling_path
+        FROM history h JOIN projects p ON p.id = h.project_id
+        WHERE h.recency = 1 AND h.previous_path IS NOT h.controlling_path
+          AND h.previous_path IS NOT NULL
+        ORDER BY h.analysis_date DESC, h.id DESC
+        LIMIT ? OFFSET ?
+        """, (limit, offset))
+
+
+# Shared instances per process and database file
+_instances = {}
+_instances_lock = threading.Lock()
 
 
 # Function to get database instance
-def get_db_instance(db_path: str = "es_analysis.db") -> ESDatabase:
-    """Get a database instance"""
-    return ESDatabase(db_path)
+def get_db_instance(db_path: str = "es_analysis.db", timeout: float = 30.0) -> ESDatabase:
+    """
+    Get the shared database instance for a database file.
+    
+    The instance is thread-safe, so callers in any thread of this process
+    reuse it instead of opening their own; close() only releases the calling
+    thread's connection. The timeout applies when the instance is created.
+    """
+    key = (os.getpid(), db_path if db_path == ":memory:" else os.path.abspath(db_path))
+    with _instances_lock:
+        db = _instances.get(key)
+        if db is None:
+            db = _instances[key] = ESDatabase(db_path, timeout)
+    return db
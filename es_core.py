@@ -1,8 +1,47 @@
 """Core functions for Earned Schedule calculations."""
+from bisect import bisect_right
+from itertools import accumulate
+
 import numpy as np
 from typing import List, Tuple, Dict, Union, Optional
 
 
+def earned_schedule_value(pv_series: List[float], ev_t: float,
+                          pv_max: Optional[List[float]] = None) -> float:
+    """
+    Compute ES for one cumulative EV value.
+    
+    Args:
+        pv_series: Cumulative Planned Value series
+        ev_t: Cumulative Earned Value
+        pv_max: Running maximum of pv_series, for callers that compute ES
+                repeatedly against the same baseline (computed if omitted)
+    
+    Returns:
+        ES
+    """
+    if pv_max is None:
+        pv_max = list(accumulate(pv_series, max))
+    
+    # N is the last index before the first PV greater than EV, which is the
+    # first index where the running maximum of PV exceeds EV
+    count = bisect_right(pv_max, ev_t)
+    n = max(count - 1, 0)
+    
+    if count == 0:
+        # EV is less than first PV
+        return ev_t / pv_series[0] if pv_series[0] > 0 else 0
+    if n >= len(pv_series) - 1:
+        # EV exceeds final PV
+        return float(n)
+    
+    # Interpolate between periods
+    prev_pv = pv_series[n]
+    next_pv = pv_series[n+1]
+    denom = next_pv - prev_pv if next_pv > prev_pv else 1  # Avoid division by zero
+    return float(n) + (ev_t - prev_pv) / denom
+
+
 def compute_earned_schedule(pv_series: List[float], ev_series: List[float], at: int) -> Tuple[float, float, float]:
     """
     Compute Earned Schedule metrics for a given period.
@@ -18,31 +57,7 @@ def compute_earned_schedule(pv_series: List[float], ev_series: List[float], at:
     if at < 0 or at >= len(ev_series):
         raise ValueError(f"Invalid period {at}. Must be between 0 and {len(ev_series)-1}")
     
-    ev_t = ev_series[at]
-    
-    # Find N: last index where PV <= EV_t
-    n = 0
-    for i, pv_val in enumerate(pv_series):
-        if pv_val <= ev_t:
-            n = i
-        else:
-            break
-    
-    # Compute ES
-    if n == 0 and pv_series[0] > ev_t:
-        # EV is less than first PV
-        es_t = ev_t / pv_series[0] if pv_series[0] > 0 else 0
-    elif n >= len(pv_series) - 1:
-        # EV exceeds final PV
-        es_t = float(n)
-    else:
-        # Interpolate between periods
-        prev_pv = pv_series[n]
-        next_pv = pv_series[n+1]
-        num = ev_t - prev_pv
-        denom = next_pv - prev_pv if next_pv > prev_pv else 1  # Avoid division by zero
-        frac = num / denom
-        es_t = float(n) + frac
+    es_t = earned_schedule_value(pv_series, ev_series[at])
     
     # Compute SPI(t) and SV(t)
     at_float = float(at)
@@ -67,3 +82,78 @@ def compute_ieac(planned_duration: float, spi_t: float) -> float:
         return float('inf')  # Avoid division by zero or negative SPI
     
     return planned_duration / spi_t
+
+
+def compute_ieac_series(planned_duration: float, spi_t: np.ndarray) -> np.ndarray:
+    """
+    Compute IEAC(t) for a whole series of SPI(t) values.
+    
+    Args:
+        planned_duration: Planned Duration (PD)
+        spi_t: Array of SPI(t) values
+    
+    Returns:
+        Array of IEAC(t) values (inf where SPI(t) <= 0)
+    """
+    spi_t = np.asarray(spi_t, dtype=float)
+    ieac = np.full(spi_t.shape, np.inf)
+    positive = spi_t > 0
+    ieac[positive] = planned_duration / spi_t[positive]
+    return ieac
+
+
+def compute_earned_schedule_series(pv_series: List[float], ev_series: List[float],
+                                   planned_duration: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute Earned Schedule metrics for every period in a single pass.
+    
+    Gives the same results as calling compute_earned_schedule() and
+    compute_ieac() for each period, but locates N with a binary search over
+    the running maximum of PV instead of a linear scan per period.
+    
+    Args:
+        pv_series: Cumulative Planned Value series
+        ev_series: Cumulative Earned Value series
+        planned_duration: Planned Duration (PD)
+    
+    Returns:
+        Tuple of arrays (ES, SPI(t), SV(t), IEAC(t)), one entry per EV period
+    """
+    pv = np.asarray(pv_series, dtype=float)
+    ev = np.asarray(ev_series, dtype=float)
+    
+    # The scalar scan stops at the first PV greater than EV, which is the
+    # first index where the running maximum of PV exceeds EV
+    pv_max = np.maximum.accumulate(pv)
+    count = np.searchsorted(pv_max, ev, side='right')
+    n = np.maximum(count - 1, 0)
+    
+    last = len(pv) - 1
+    below_first = count == 0
+    beyond_last = ~below_first & (n >= last)
+    between = ~below_first & ~beyond_last
+    
+    es = n.astype(float)
+    
+    # EV is less than first PV
+    if pv[0] > 0:
+        es[below_first] = ev[below_first] / pv[0]
+    else:
+        es[below_first] = 0.0
+    
+    # Interpolate between periods
+    idx = n[between]
+    prev_pv = pv[idx]
+    next_pv = pv[idx + 1]
+    denom = np.where(next_pv > prev_pv, next_pv - prev_pv, 1.0)  # Avoid division by zero
+    es[between] = idx + (ev[between] - prev_pv) / denom
+    
+    # Compute SPI(t) and SV(t)
+    at = np.arange(len(ev), dtype=float)
+    spi_t = np.ones(len(ev))  # Define SPI=1 at t=0
+    spi_t[1:] = es[1:] / at[1:]
+    sv_t = es - at
+    
+    ieac_t = compute_ieac_series(planned_duration, spi_t)
+    
+    return es, spi_t, sv_t, ieac_t
@@ -0,0 +1,167 @@
+"""Incremental Earned Schedule tracking for appending status periods."""
+from itertools import accumulate
+from typing import Dict, List, Tuple, Optional
+
+import es_core
+import path_analysis
+
+
+class _SeriesTracker:
+    """Earned Schedule state for a single PV baseline (overall or one path)"""
+
+    def __init__(self, pv_series: List[float], planned_duration: float):
+        self.pv_series = [float(pv) for pv in pv_series]
+        # Running maximum of PV, so N can be found with a binary search
+        self.pv_max = list(accumulate(self.pv_series, max))
+        self.planned_duration = planned_duration
+        self.ev_series = []
+        self.metrics = []  # (ES, SPI(t), SV(t), IEAC(t)) per period
+        self.last_ev = 0.0
+
+    def append(self, ev) -> Tuple[float, float, float, float]:
+        """Append one EV value ("XX" repeats the last EV) and compute its metrics"""
+        if ev == "XX":
+            ev_t = self.last_ev  # No progress, use last EV
+        else:
+            ev_t = float(ev)
+            self.last_ev = ev_t
+
+        at = len(self.ev_series)
+        self.ev_series.append(ev_t)
+
+        es_t = es_core.earned_schedule_value(self.pv_series, ev_t, self.pv_max)
+
+        at_float = float(at)
+        spi_t = es_t / at_float if at_float > 0 else 1.0  # Define SPI=1 at t=0
+        sv_t = es_t - at_float
+        ieac_t = es_core.compute_ieac(self.planned_duration, spi_t)
+
+        result = (es_t, spi_t, sv_t, ieac_t)
+        self.metrics.append(result)
+        return result
+
+
+class EarnedScheduleTracker:
+    """
+    Stateful Earned Schedule tracker that grows one status period at a time.
+
+    Holds the PV baselines and all accumulated results, so each new status
+    update only computes the new period (a binary search per series) instead
+    of re-analysing the whole history.
+    """
+
+    def __init__(self, pv_series: List[float], planned_duration: float,
+                 path_pv: Optional[Dict[str, List[float]]] = None,
+                 spike_options: Optional[Dict] = None):
+        """
+        Args:
+            pv_series: Cumulative Planned Value baseline for the project
+            planned_duration: Planned Duration (PD)
+            path_pv: Dictionary of path names to their cumulative PV baselines
+            spike_options: Keyword arguments for path_analysis.IEACSpikeDetector
+        """
+        self.planned_duration = planned_duration
+        self.overall = _SeriesTracker(pv_series, planned_duration)
+        self.paths = {name: _SeriesTracker(pv, planned_duration)
+                      for name, pv in (path_pv or {}).items()}
+        self.controlling_path = []
+        self.anomalies = {}
+        self.spike_detector = path_analysis.IEACSpikeDetector(list(self.paths), **(spike_options or {}))
+        # ES non-decreasing rule state for select_controlling_path
+        self.prev_path = None
+        self.prev_es = None
+
+    @classmethod
+    def from_project_data(cls, project_data: Dict) -> 'EarnedScheduleTracker':
+        """
+        Build a tracker from loaded project data and replay its EV history.
+
+        Args:
+            project_data: Dictionary as returned by data_handler.load_project_data
+
+        Returns:
+            Tracker positioned after the last recorded period
+        """
+        path_data = project_data.get('path_data') or {}
+        tracker = cls(project_data['pv_series'], project_data['planned_duration'],
+                      {name: data['pv'] for name, data in path_data.items()})
+
+        for period, ev in enumerate(project_data['ev_series']):
+            path_ev = {name: data['ev'][period] for name, data in path_data.items()
+                       if period < len(data['ev'])}
+            tracker.append_period(ev, path_ev)
+
+        return tracker
+
+    @property
+    def num_periods(self) -> int:
+        """Number of periods appended so far"""
+        return len(self.overall.ev_series)
+
+    def append_period(self, ev, path_ev: Optional[Dict[str, float]] = None) -> Tuple[float, float, float, float]:
+        """
+        Append the next status period and compute only its metrics.
+
+        Args:
+            ev: Cumulative EV of the project for the new period ("XX" for a work stoppage)
+            path_ev: Dictionary of path names to their cumulative EV for the new period
+
+        Returns:
+            Tuple of (ES, SPI(t), SV(t), IEAC(t)) for the project in the new period
+        """
+        period = self.num_periods
+        overall_result = self.overall.append(ev)
+
+        path_ev = path_ev or {}
+        unknown = set(path_ev) - set(self.paths)
+        if unknown:
+            raise ValueError(f"No PV baseline for paths: {', '.join(sorted(unknown))}")
+
+        period_ieacs = {}
+        period_es = {}
+        for name, value in path_ev.items():
+            path_tracker = self.paths[name]
+            if len(path_tracker.ev_series) != period:
+                raise ValueError(f"Path {name} has {len(path_tracker.ev_series)} periods, expected {period}")
+            es_l, spi_t, sv_t, ieac_t = path_tracker.append(value)
+            period_ieacs[name] = ieac_t
+            period_es[name] = es_l
+
+        if period_ieacs:
+            self._select_controlling_path(period, period_ieacs, period_es)
+        else:
+            self.controlling_path.append(None)  # Keeps controlling_path[i] on period i
+        if self.paths:
+            self.spike_detector.update(period_ieacs)
+
+        return overall_result
+
+    def _select_controlling_path(self, period: int, period_ieacs: Dict[str, float],
+                                 period_es: Dict[str, float]) -> None:
+        """Apply the controlling path selection and path-switch anomaly rule for one period"""
+        selected_path = path_analysis.select_controlling_path(
+            period_ieacs, period_es, self.prev_path, self.prev_es)
+
+        # If path switched and previous had much higher IEAC, mark as anomaly
+        if selected_path != self.prev_path and self.prev_path is not None:
+            if self.prev_path in period_ieacs and period_ieacs[self.prev_path] > 1.5 * period_ieacs[selected_path]:
+                self.anomalies[period] = (self.prev_path, period_ieacs[self.prev_path])
+
+        self.controlling_path.append(selected_path)
+        self.prev_path = selected_path
+        self.prev_es = period_es[selected_path] if selected_path in period_es else None
+
+    @property
+    def results(self) -> Dict:
+        """
+        Accumulated results in the same layout as main.analyze_project.
+
+        controlling_path has one entry per period, None for periods without path data.
+        """
+        return {
+            'overall_metrics': [(es, spi, ieac) for es, spi, sv, ieac in self.overall.metrics],
+            'path_metrics': {name: list(t.metrics) for name, t in self.paths.items()},
+            'controlling_path': list(self.controlling_path),
+            'anomalies': dict(self.anomalies),
+            'ieac_spikes': {name: list(periods) for name, periods in self.spike_detector.anomalies.items()}
+        }
@@ -0,0 +1,160 @@
+"""Background analysis jobs for the web application"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+DEFAULT_MAX_WORKERS = 2
+DEFAULT_JOB_TTL_SECONDS = 3600
+
+
+class Job:
+    """State of one analysis job, updated by the worker running it"""
+
+    def __init__(self, job_id: str, name: str):
+        self.id = job_id
+        self.name = name
+        self.state = "queued"  # queued, running, completed or failed
+        self.progress = 0
+        self.message = "Waiting for a free worker..."
+        self.error = None
+        self.results = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.cleanup = []  # Callables run when the job expires
+        self.context = {}  # Data the web app keeps to serve the results (e.g. chart inputs)
+        self.version = 0  # Incremented on every state change
+        self._changed = threading.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("completed", "failed")
+
+    def update(self, message: str, progress: Optional[int] = None, state: Optional[str] = None) -> None:
+        """Report progress (and state changes) from the worker, waking any watchers"""
+        with self._changed:
+            self.message = message
+            if progress is not None:
+                self.progress = progress
+            if state is not None:
+                self.state = state
+                if self.finished:
+                    self.finished_at = time.time()
+            self.version += 1
+            self._changed.notify_all()
+
+    def wait_for_change(self, version: int, timeout: Optional[float] = None) -> int:
+        """
+        Block until the job's version differs from version, or timeout passes.
+
+        Returns:
+            The current version
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def to_status(self) -> Dict:
+        """Status in the layout served by /status/<job_id>"""
+        return {
+            "job_id": self.id,
+            "name": self.name,
+            "state": self.state,
+            "in_progress": self.state == "running",
+            "progress": self.progress,
+            "message": self.message,
+            "completed": self.finished,
+            "error": self.error,
+            "version": self.version
+        }
+
+
+class JobQueue:
+    """
+    Runs jobs on a bounded pool of worker threads and keeps their state by job ID.
+
+    Finished jobs are dropped ttl_seconds after they finish, checked lazily
+    whenever a job is submitted or looked up.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS,
+                 ttl_seconds: float = DEFAULT_JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, name: str) -> Job:
+        """Register a new queued job (call submit to start it)"""
+        self.expire()
+        job = Job(uuid.uuid4().hex, name)
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def submit(self, job: Job, func: Callable, *args, **kwargs) -> Job:
+        """
+        Queue func(job, *args, **kwargs) to run on a worker thread.
+
+        The return value becomes the job's results; an exception fails the job.
+        """
+        self._executor.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def run(self, job: Job, func: Callable, *args, **kwargs) -> Job:
+        """Run func(job, *args, **kwargs) in the calling thread, recording it like submit"""
+        self._run(job, func, args, kwargs)
+        return job
+
+    def _run(self, job: Job, func: Callable, args, kwargs) -> None:
+        job.update("Starting analysis...", state="running")
+        try:
+            job.results = func(job, *args, **kwargs)
+            job.update("Analysis completed successfully", 100, state="completed")
+        except Exception as e:
+            import traceback
+            print(traceback.format_exc())
+            job.error = str(e)
+            job.update(f"Analysis failed: {str(e)}", state="failed")
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job that has not expired"""
+        self.expire()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        """All jobs that have not expired, oldest first"""
+        self.expire()
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda job: job.created_at)
+
+    def expire(self) -> int:
+        """
+        Drop finished jobs older than the TTL and run their cleanup callables.
+
+        Returns:
+            Number of jobs removed
+        """
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job.finished and job.finished_at < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            for cleanup in job.cleanup:
+                cleanup()
+        return len(expired)
+
+    def remove(self, job: Job) -> None:
+        """Drop a finished job now instead of after the TTL and run its cleanup callables"""
+        with self._lock:
+            self._jobs.pop(job.id, None)
+        for cleanup in job.cleanup:
+            cleanup()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop accepting jobs and, if wait is set, finish the queued ones"""
+        self._executor.shutdown(wait=wait)
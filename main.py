@@ -1,32 +1,121 @@
 """Main script for Earned Schedule and Longest Path Analysis"""
+import gc
+import hashlib
+import io
 import os
 import sys
+import threading
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
-from typing import Dict, List, Tuple, Optional
+import numpy as np
+from typing import Callable, Dict, List, Tuple, Optional
 
 # Import our modules
 import es_core
 import path_analysis
 import data_handler
+import data_formats
 import visualization
 import database
+import project_cache
 
+# Serializes chart rendering between threads (e.g. web analysis workers)
+_chart_lock = threading.Lock()
 
-def analyze_project(excel_file: str, output_dir: str = None, project_name: str = None) -> Dict:
+# Percent complete reported when each analysis stage starts
+PROGRESS = {
+    'load': 5,
+    'overall': 20,
+    'paths': 30,
+    'selection': 60,
+    'export': 70,
+    'charts': 80,
+    'database': 90,
+}
+
+
+def _no_progress(message: str, progress: int) -> None:
+    pass
+
+
+# Part of every analysis input hash; bump when a change alters analysis results
+ANALYSIS_VERSION = 1
+
+
+def load_project_input(excel_file: str, use_cache: bool = True, cache_dir: Optional[str] = None) -> Dict:
+    """
+    Load project data from an Excel workbook or another supported input format.
+    
+    Args:
+        excel_file: Path to an Excel workbook, or a .csv, .jsonl or .npz file
+        use_cache: Reuse parsed workbook data when the file content is unchanged
+        cache_dir: Directory of the parsed-workbook cache (see project_cache)
+    
+    Returns:
+        Dictionary containing project data
+    """
+    if not excel_file.lower().endswith('.xlsx'):
+        return data_formats.load_project_file(excel_file)  # CSV, JSON Lines or .npz input
+    if use_cache:
+        return project_cache.load_project_data_cached(excel_file, cache_dir)
+    return data_handler.load_project_data(excel_file)
+
+
+def analyze_project(excel_file: str, output_dir: str = None, project_name: str = None,
+                    near_critical_k: int = 3, prune_paths: bool = False,
+                    use_cache: bool = True, cache_dir: Optional[str] = None,
+                    generate_charts: bool = True, save_to_db: bool = True,
+                    db: Optional[database.ESDatabase] = None,
+                    project_data: Optional[Dict] = None,
+                    source_file: Optional[str] = None,
+                    progress_callback: Optional[Callable[[str, int], None]] = None,
+                    write_excel: bool = True, input_hash: Optional[str] = None,
+                    verbose: bool = False) -> Dict:
     """
     Perform full Earned Schedule and Longest Path analysis on project data.
     
+    When the database already holds an analysis of this project (same name
+    and file) with the same file content and parameters, its stored results
+    are reused instead of recomputing and storing them again.
+    
     Args:
-        excel_file: Path to Excel file with project data
+        excel_file: Path to project data (Excel workbook, or a .csv, .jsonl or .npz
+                    file in a format read by data_formats)
         output_dir: Directory for output files (defaults to script directory)
         project_name: Name of the project (defaults to Excel filename)
+        near_critical_k: Number of near-critical paths to report per period
+        prune_paths: Skip full metrics for paths whose IEAC upper bound shows
+                     they cannot become controlling (they are left out of
+                     path_metrics and listed in pruned_paths)
+        use_cache: Reuse parsed workbook data when the file content is unchanged
+        cache_dir: Directory of the parsed-workbook cache (see project_cache)
+        generate_charts: Render the PNG charts into output_dir
+        save_to_db: Store the project and analysis in the database; their IDs are
+                    added to the results as 'project_id' and 'analysis_id'
+        db: Open database to look up and store analyses in (defaults to the
+            default instance when save_to_db is set); writes join any
+            transaction open on it
+        project_data: Already loaded project data (see load_project_input), used
+                      instead of reading excel_file
+        source_file: File recorded for the project in the database, when
+                     excel_file is a temporary copy (defaults to excel_file)
+        progress_callback: Called as progress_callback(message, percent) when
+                           each stage of the analysis starts
+        write_excel: Write es_analysis_results.xlsx into output_dir
+        input_hash: Hash of the input and parameters (see analysis_input_hash), for
+                    input that is not read from excel_file; only needed, and
+                    otherwise only computed, when a database is in use
+        verbose: Print every path's metrics for every period
     
     Returns:
         Dictionary of analysis results
     """
-    print(f"Loading project data from {excel_file}...")
-    project_data = data_handler.load_project_data(excel_file)
+    report = progress_callback or _no_progress
+    
+    report("Loading project data...", PROGRESS['load'])
+    if project_data is None:
+        print(f"Loading project data from {excel_file}...")
+        project_data = load_project_input(excel_file, use_cache, cache_dir)
     
     # Ensure we have path data (simulate if needed)
     if not project_data['path_data'] or len(project_data['path_data']) == 0:
@@ -35,122 +124,83 @@ def analyze_project(excel_file: str, output_dir: str = None, project_name: str =
     
     # Extract key data
     pv_series = project_data['pv_series']
-    ev_series = project_data['ev_series']
     planned_duration = project_data['planned_duration']
     start_date = project_data['start_date']
     paths = project_data['paths']
     path_data = project_data['path_data']
     
     print(f"Loaded {len(pv_series)} periods of data")
+    if project_data.get('pv_violations'):
+        print(f"Warning: cumulative PV decreases at periods {project_data['pv_violations']}")
+    for path_name, path_data_items in path_data.items():
+        if path_data_items.get('pv_violations'):
+            print(f"Warning: cumulative PV of path {path_name} decreases at periods {path_data_items['pv_violations']}")
     print(f"Planned Duration: {planned_duration} periods")
     if start_date:
         print(f"Start Date: {start_date.strftime('%Y-%m-%d') if isinstance(start_date, datetime) else start_date}")
     print(f"Found {len(paths)} paths: {', '.join(paths.keys())}")
     
-    # Step 1: Compute overall project ES metrics
-    print("\nStep 1: Computing overall project Earned Schedule metrics...")
-    overall_metrics = []
-    for period in range(len(ev_series)):
-        es_t, spi_t, sv_t = es_core.compute_earned_schedule(pv_series, ev_series, period)
-        ieac_t = es_core.compute_ieac(planned_duration, spi_t)
-        overall_metrics.append((es_t, spi_t, ieac_t))
-        print(f"  Period {period}: ES={es_t:.2f}, SPI(t)={spi_t:.2f}, IEAC(t)={ieac_t:.2f} periods")
-    
-    # Step 2: Compute path-specific ES metrics
-    print("\nStep 2: Computing path-specific Earned Schedule metrics...")
-    path_metrics = {}
-    path_ieacs_history = {}
-    path_es_history = {}
-    
-    for path_name, path_data_items in path_data.items():
-        print(f"\n  Analyzing path: {path_name}")
-        path_pv = path_data_items['pv']
-        path_ev = path_data_items['ev']
-        path_results = []
-        path_ieacs = []
-        path_es_values = []
-        
-        for period in range(len(path_ev)):
-            es_l, spi_t, sv_t, ieac_t = path_analysis.compute_path_es_metrics(
-                path_pv, path_ev, period, planned_duration)
-            path_results.append((es_l, spi_t, sv_t, ieac_t))
-            path_ieacs.append(ieac_t)
-            path_es_values.append(es_l)
-            print(f"    Period {period}: ES(L)={es_l:.2f}, SPI(t)={spi_t:.2f}, IEAC(t)={ieac_t:.2f} periods")
-        
-        path_metrics[path_name] = path_results
-        path_ieacs_history[path_name] = path_ieacs
-        path_es_history[path_name] = path_es_values
-    
-    # Step 3: Select controlling path for each period
-    print("\nStep 3: Determining the controlling path for each period...")
-    controlling_path = []
-    prev_path = None
-    prev_es = None
-    anomalies = {}
-    
-    for period in range(len(ev_series)):
-        period_ieacs = {}
-        period_es = {}
-        
-        for path, metrics in path_metrics.items():
-            if period < len(metrics):
-                period_ieacs[path] = metrics[period][3]  # IEAC is index 3
-                period_es[path] = metrics[period][0]     # ES is index 0
-        
-        # Select controlling path for this period
-        selected_path = path_analysis.select_controlling_path(
-            period_ieacs, period_es, prev_path, prev_es)
-        
-        # Check for anomalies
-        if selected_path != prev_path and prev_path is not None:
-            # If path switched and previous had much higher IEAC, mark as anomaly
-            if prev_path in period_ieacs and period_ieacs[prev_path] > 1.5 * period_ieacs[selected_path]:
-                anomalies[period] = (prev_path, period_ieacs[prev_path])
-                print(f"  Period {period}: Anomaly detected! Path {prev_path} showed IEAC={period_ieacs[prev_path]:.2f}")
-        
-        controlling_path.append(selected_path)
-        print(f"  Period {period}: Controlling path is {selected_path} with IEAC(t)={period_ieacs[selected_path]:.2f} periods")
-        prev_path = selected_path
-        prev_es = period_es[selected_path] if selected_path in period_es else None
+    # Reuse the stored analysis of identical input and parameters, if any
+    own_db = save_to_db and db is None
+    if own_db:
+        db = database.get_db_instance()
+    if project_name is None:
+        project_name = os.path.splitext(os.path.basename(excel_file))[0]
+    if input_hash is None and db is not None:
+        # Reuse the hash the workbook cache took while loading, if it did
+        input_hash = analysis_input_hash(excel_file, near_critical_k, prune_paths,
+                                         project_data.get('content_hash'))
+    existing_id = None
+    if db is not None and input_hash:
+        project_id = db.find_project(project_name, os.path.abspath(source_file or excel_file))
+        if project_id is not None:
+            existing_id = db.find_analysis(input_hash, project_id)
     
-    # Prepare results
-    results = {
-        'overall_metrics': overall_metrics,
-        'path_metrics': path_metrics,
-        'controlling_path': controlling_path,
-        'anomalies': anomalies
-    }
+    if existing_id is not None:
+        report("Reusing the stored analysis of identical input...", PROGRESS['overall'])
+        print(f"\nInput and parameters match stored analysis {existing_id}, reusing its results")
+        results = load_stored_results(db, existing_id, project_data, near_critical_k)
+    else:
+        results = compute_results(project_data, near_critical_k, prune_paths, report, verbose)
+        results['input_hash'] = input_hash
+    controlling_path = results['controlling_path']
+    path_metrics = results['path_metrics']
     
     # Create output directory if needed
     if output_dir is None:
         output_dir = os.path.dirname(os.path.abspath(__file__))
         output_dir = os.path.join(output_dir, "results")
-    os.makedirs(output_dir, exist_ok=True)
+    if write_excel or generate_charts:
+        os.makedirs(output_dir, exist_ok=True)
     
     # Generate output files
-    output_excel = os.path.join(output_dir, "es_analysis_results.xlsx")
-    data_handler.write_results_to_excel(project_data, results, output_excel)
-    print(f"\nAnalysis results written to {output_excel}")
+    if write_excel:
+        report("Writing Excel results...", PROGRESS['export'])
+        output_excel = os.path.join(output_dir, "es_analysis_results.xlsx")
+        data_handler.write_results_to_excel(project_data, results, output_excel)
+        print(f"\nAnalysis results written to {output_excel}")
     
     # Generate visualizations
-    generate_visualizations(project_data, results, output_dir)
+    if generate_charts:
+        report("Rendering charts...", PROGRESS['charts'])
+        with _chart_lock:  # pyplot keeps global state, render one chart set at a time
+            generate_visualizations(project_data, results, output_dir)
     
     # Save to database
-    if project_name is None:
-        project_name = os.path.splitext(os.path.basename(excel_file))[0]
-    
-    print("\nSaving results to database...")
-    db = database.get_db_instance()
-    project_id = db.add_project(
-        name=project_name,
-        planned_duration=planned_duration,
-        start_date=start_date if isinstance(start_date, datetime) else None,
-        excel_file=os.path.abspath(excel_file)
-    )
-    analysis_id = db.add_analysis(project_id, results)
-    print(f"Saved as project ID: {project_id}, analysis ID: {analysis_id}")
-    db.close()
+    if save_to_db and existing_id is None:
+        report("Saving results to database...", PROGRESS['database'])
+        print("\nSaving results to database...")
+        try:
+            project_id, analysis_id = save_results_to_db(db, project_name, source_file or excel_file,
+                                                         project_data, results)
+        finally:
+            if own_db:
+                db.close()
+        results['project_id'] = project_id
+        results['analysis_id'] = analysis_id
+        print(f"Saved as project ID: {project_id}, analysis ID: {analysis_id}")
+    elif own_db:
+        db.close()
     
     # Print final forecast
     final_period = len(controlling_path) - 1
@@ -179,55 +229,268 @@ def analyze_project(excel_file: str, output_dir: str = None, project_name: str =
     return results
 
 
-def generate_visualizations(project_data: Dict, results: Dict, output_dir: str) -> None:
+def analysis_input_hash(excel_file: Optional[str], near_critical_k: int, prune_paths: bool,
+                        content_hash: Optional[str] = None) -> Optional[str]:
     """
-    Generate and save visualizations.
+    Hash an input file's contents together with the analysis parameters.
+    
+    Args:
+        excel_file: Input file to hash
+        near_critical_k: Number of near-critical paths reported per period
+        prune_paths: Whether paths that cannot become controlling are pruned
+        content_hash: SHA-256 hex digest of the input, used instead of reading
+                      excel_file (e.g. for an upload held in memory)
+    
+    Returns:
+        SHA-256 hex digest, or None if excel_file is not a readable file
+    """
+    if content_hash is None:
+        if excel_file is None or not os.path.isfile(excel_file):
+            return None
+        content_hash = project_cache.file_content_hash(excel_file)
+    key = f"{content_hash}:{near_critical_k}:{prune_paths}:{ANALYSIS_VERSION}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def load_stored_results(db: database.ESDatabase, analysis_id: int, project_data: Dict,
+                        near_critical_k: int = 3) -> Dict:
+    """
+    Rebuild the results of a stored analysis in the layout of compute_results.
+    
+    The metrics and controlling paths come from the database; switches,
+    anomalies, near-critical paths and IEAC spikes are derived from them.
+    
+    Args:
+        db: Open database
+        analysis_id: ID of the stored analysis
+        project_data: Dictionary of project data the analysis was run on
+        near_critical_k: Number of near-critical paths to report per period
+    
+    Returns:
+        Dictionary of analysis results, including 'project_id' and 'analysis_id'
+    """
+    stored = db.get_analysis_results(analysis_id)
+    path_metrics = stored['path_metrics']
+    controlling_path = stored['controlling_path']
+    num_periods = len(stored['overall_metrics'])
+    
+    path_switches = [(period, controlling_path[period - 1], controlling_path[period])
+                     for period in range(1, len(controlling_path))
+                     if controlling_path[period] != controlling_path[period - 1]]
+    anomalies = {period: (prev_path, path_metrics[prev_path][period][3])
+                 for period, prev_path, _ in path_switches if period in stored['anomaly_periods']}
+    
+    path_names = list(path_metrics)
+    ieac_matrix = path_analysis.build_metric_matrix(path_metrics, path_names, 3, num_periods)
+    top_paths = path_analysis.top_k_paths(ieac_matrix, near_critical_k)
+    spike_matrix = path_analysis.detect_ieac_spikes(ieac_matrix)
+    
+    return {
+        'overall_metrics': stored['overall_metrics'],
+        'path_metrics': path_metrics,
+        'controlling_path': controlling_path,
+        'anomalies': anomalies,
+        'near_critical_paths': [[path_names[i] for i in row if i >= 0] for row in top_paths],
+        'path_switches': path_switches,
+        'ieac_spikes': {path_names[row]: periods.nonzero()[0].tolist()
+                        for row, periods in enumerate(spike_matrix) if periods.any()},
+        'pruned_paths': [name for name in project_data['path_data'] if name not in path_metrics],
+        'input_hash': stored['input_hash'],
+        'project_id': stored['project_id'],
+        'analysis_id': analysis_id
+    }
+
+
+def compute_results(project_data: Dict, near_critical_k: int = 3, prune_paths: bool = False,
+                    progress_callback: Optional[Callable[[str, int], None]] = None,
+                    verbose: bool = False) -> Dict:
+    """
+    Compute the Earned Schedule metrics, controlling paths and anomalies of a project.
     
     Args:
+        project_data: Dictionary of project data, with path data
+        near_critical_k: Number of near-critical paths to report per period
+        prune_paths: Skip full metrics for paths that cannot become controlling
+        progress_callback: Called as progress_callback(message, percent) per stage
+        verbose: Print every path's metrics for every period, not just a summary
+    
+    Returns:
+        Dictionary of analysis results
+    """
+    report = progress_callback or _no_progress
+    pv_series = project_data['pv_series']
+    ev_series = project_data['ev_series']
+    planned_duration = project_data['planned_duration']
+    path_data = project_data['path_data']
+    
+    # Step 1: Compute overall project ES metrics
+    report("Computing overall Earned Schedule metrics...", PROGRESS['overall'])
+    print("\nStep 1: Computing overall project Earned Schedule metrics...")
+    es_arr, spi_arr, sv_arr, ieac_arr = es_core.compute_earned_schedule_series(
+        pv_series, ev_series, planned_duration)
+    overall_metrics = list(zip(es_arr.tolist(), spi_arr.tolist(), ieac_arr.tolist()))
+    for period, (es_t, spi_t, ieac_t) in enumerate(overall_metrics):
+        print(f"  Period {period}: ES={es_t:.2f}, SPI(t)={spi_t:.2f}, IEAC(t)={ieac_t:.2f} periods")
+    
+    # Step 2: Compute path-specific ES metrics
+    report("Computing path-specific Earned Schedule metrics...", PROGRESS['paths'])
+    print("\nStep 2: Computing path-specific Earned Schedule metrics...")
+    path_names, path_pv_matrix, path_ev_matrix = path_analysis.build_path_matrices(path_data)
+    if prune_paths:
+        es_matrix, spi_matrix, sv_matrix, ieac_matrix, computed = path_analysis.compute_pruned_path_es_matrices(
+            path_pv_matrix, path_ev_matrix, planned_duration, num_periods=len(ev_series))
+        pruned_paths = [name for name, keep in zip(path_names, computed) if not keep]
+        print(f"  Pruned {len(pruned_paths)} of {len(path_names)} paths that cannot become controlling")
+    else:
+        es_matrix, spi_matrix, sv_matrix, ieac_matrix = path_analysis.compute_path_es_matrices(
+            path_pv_matrix, path_ev_matrix, planned_duration)
+        computed = [True] * len(path_names)
+        pruned_paths = []
+
+    # One (ES, SPI(t), SV(t), IEAC(t)) tuple per period, converted from the matrices in one pass.
+    # The cyclic garbage collector is paused meanwhile: it would otherwise rescan the
+    # millions of new (acyclic) floats and tuples over and over.
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        metric_rows = np.stack([es_matrix, spi_matrix, sv_matrix, ieac_matrix], axis=2).tolist()
+        path_metrics = {}
+        for row, path_name in enumerate(path_names):
+            if computed[row]:
+                path_metrics[path_name] = list(map(tuple, metric_rows[row][:len(path_data[path_name]['ev'])]))
+        del metric_rows
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    print(f"  Computed metrics for {len(path_metrics)} paths")
+    
+    if verbose:
+        for path_name, path_results in path_metrics.items():
+            print(f"\n  Analyzing path: {path_name}")
+            for period, (es_l, spi_t, sv_t, ieac_t) in enumerate(path_results):
+                print(f"    Period {period}: ES(L)={es_l:.2f}, SPI(t)={spi_t:.2f}, IEAC(t)={ieac_t:.2f} periods")
+    
+    # Step 3: Select controlling path for each period
+    report("Selecting the controlling path...", PROGRESS['selection'])
+    print("\nStep 3: Determining the controlling path for each period...")
+    num_periods = len(ev_series)
+    controlling, switches, anomaly_records = path_analysis.select_controlling_paths(
+        ieac_matrix[:, :num_periods], es_matrix[:, :num_periods])
+    controlling_path = [path_names[i] for i in controlling]
+    anomalies = {period: (path_names[path], ieac) for period, (path, ieac) in anomaly_records.items()}
+    path_switches = [(period, path_names[old], path_names[new]) for period, old, new in switches]
+    
+    top_paths = path_analysis.top_k_paths(ieac_matrix[:, :num_periods], near_critical_k)
+    near_critical = [[path_names[i] for i in row if i >= 0] for row in top_paths]
+    
+    for period, selected in enumerate(controlling):
+        if period in anomalies:
+            prev_path, prev_ieac = anomalies[period]
+            print(f"  Period {period}: Anomaly detected! Path {prev_path} showed IEAC={prev_ieac:.2f}")
+        print(f"  Period {period}: Controlling path is {path_names[selected]} with IEAC(t)={ieac_matrix[selected, period]:.2f} periods")
+    
+    # Flag IEAC spikes on every path
+    spike_matrix = path_analysis.detect_ieac_spikes(ieac_matrix)
+    ieac_spikes = {path_names[row]: periods.nonzero()[0].tolist()
+                   for row, periods in enumerate(spike_matrix) if periods.any()}
+    
+    # Prepare results
+    results = {
+        'overall_metrics': overall_metrics,
+        'path_metrics': path_metrics,
+        'controlling_path': controlling_path,
+        'anomalies': anomalies,
+        'near_critical_paths': near_critical,
+        'path_switches': path_switches,
+        'ieac_spikes': ieac_spikes,
+        'pruned_paths': pruned_paths
+    }
+    
+    return results
+
+
+def save_results_to_db(db: database.ESDatabase, project_name: str, excel_file: str,
+                       project_data: Dict, results: Dict) -> Tuple[int, int]:
+    """
+    Store an analysis, under the existing project of the same name and file if there is one.
+    
+    Args:
+        db: Open database
+        project_name: Name of the project
+        excel_file: Path of the analyzed input file
         project_data: Dictionary of project data
         results: Dictionary of analysis results
-        output_dir: Directory to save visualizations
+    
+    Returns:
+        Tuple of (project ID, analysis ID)
+    """
+    start_date = project_data['start_date']
+    with db.transaction():
+        # A re-analysis of the same project joins its existing project record
+        project_id = db.find_project(project_name, os.path.abspath(excel_file))
+        if project_id is None:
+            project_id = db.add_project(
+                name=project_name,
+                planned_duration=project_data['planned_duration'],
+                start_date=start_date if isinstance(start_date, datetime) else None,
+                excel_file=os.path.abspath(excel_file)
+            )
+        analysis_id = db.add_analysis(project_id, results, results.get('input_hash'))
+    return project_id, analysis_id
+
+
+# Charts rendered for an analysis: name (also the PNG file name) and description
+CHARTS = {
+    'pv_ev_curves': "PV/EV curves",
+    'es_metrics': "ES metrics chart",
+    'ieac_forecasts': "IEAC forecasts chart",
+    'completion_forecast': "Completion date forecast",
+}
+
+
+def available_charts(project_data: Dict) -> List[str]:
+    """Names of the CHARTS that apply to a project (the completion forecast needs a start date)"""
+    return [chart for chart in CHARTS
+            if chart != 'completion_forecast' or isinstance(project_data['start_date'], datetime)]
+
+
+def plot_chart(chart: str, project_data: Dict, results: Dict) -> bool:
+    """
+    Draw one chart of an analysis as the current pyplot figure.
+    
+    Args:
+        chart: Chart name, a key of CHARTS
+        project_data: Dictionary of project data
+        results: Dictionary of analysis results
+    
+    Returns:
+        False if the chart does not apply to the project (nothing is drawn)
     """
-    print("\nGenerating visualizations...")
     # Extract data for plotting
     periods = list(range(1, len(project_data['ev_series']) + 1))
-    
-    # Extract metrics
-    overall_es = [m[0] for m in results['overall_metrics']]
-    overall_spi = [m[1] for m in results['overall_metrics']]
     overall_ieac = [m[2] for m in results['overall_metrics']]
     
-    # PV vs EV curve
-    visualization.plot_pv_ev_curves(project_data['pv_series'], project_data['ev_series'], periods)
-    pv_ev_file = os.path.join(output_dir, "pv_ev_curves.png")
-    plt.savefig(pv_ev_file)
-    print(f"  PV/EV curves saved to {pv_ev_file}")
-    plt.close()
-    
-    # ES and SPI(t) metrics
-    visualization.plot_es_metrics(periods, overall_es, overall_spi)
-    es_metrics_file = os.path.join(output_dir, "es_metrics.png")
-    plt.savefig(es_metrics_file)
-    print(f"  ES metrics chart saved to {es_metrics_file}")
-    plt.close()
-    
-    # Prepare path IEACs for plotting
-    path_ieacs_for_plot = {}
-    for path, metrics in results['path_metrics'].items():
-        path_ieacs_for_plot[path] = [m[3] for m in metrics]  # IEAC is index 3
-    
-    # IEAC forecasts
-    visualization.plot_ieac_forecasts(
-        periods, path_ieacs_for_plot, overall_ieac, 
-        project_data['planned_duration'], results['controlling_path'], 
-        results['anomalies'])
-    ieac_file = os.path.join(output_dir, "ieac_forecasts.png")
-    plt.savefig(ieac_file)
-    print(f"  IEAC forecasts chart saved to {ieac_file}")
-    plt.close()
-    
-    # Completion date forecast (if start date is available)
-    if isinstance(project_data['start_date'], datetime):
+    if chart == 'pv_ev_curves':
+        visualization.plot_pv_ev_curves(project_data['pv_series'], project_data['ev_series'], periods)
+    
+    elif chart == 'es_metrics':
+        overall_es = [m[0] for m in results['overall_metrics']]
+        overall_spi = [m[1] for m in results['overall_metrics']]
+        visualization.plot_es_metrics(periods, overall_es, overall_spi)
+    
+    elif chart == 'ieac_forecasts':
+        path_ieacs_for_plot = {}
+        for path, metrics in results['path_metrics'].items():
+            path_ieacs_for_plot[path] = [m[3] for m in metrics]  # IEAC is index 3
+        visualization.plot_ieac_forecasts(
+            periods, path_ieacs_for_plot, overall_ieac, 
+            project_data['planned_duration'], results['controlling_path'], 
+            results['anomalies'])
+    
+    elif chart == 'completion_forecast':
+        # Completion date forecast needs a start date
+        if not isinstance(project_data['start_date'], datetime):
+            return False
         # Get controlling path IEAC for each period
         controlling_ieacs = []
         for i, path in enumerate(results['controlling_path']):
@@ -236,13 +499,56 @@ def generate_visualizations(project_data: Dict, results: Dict, output_dir: str)
                 controlling_ieacs.append(path_metrics[i][3])  # IEAC is index 3
             else:
                 controlling_ieacs.append(overall_ieac[i])  # Fallback to overall
-        
         visualization.plot_completion_date_forecast(
             periods, controlling_ieacs, project_data['start_date'], 
             project_data['planned_duration'])
-        completion_file = os.path.join(output_dir, "completion_forecast.png")
-        plt.savefig(completion_file)
-        print(f"  Completion date forecast saved to {completion_file}")
+    
+    else:
+        raise ValueError(f"Unknown chart: {chart}")
+    return True
+
+
+def render_chart(chart: str, project_data: Dict, results: Dict, width: Optional[int] = None) -> Optional[bytes]:
+    """
+    Render one chart of an analysis to PNG in memory.
+    
+    Args:
+        chart: Chart name, a key of CHARTS
+        project_data: Dictionary of project data
+        results: Dictionary of analysis results
+        width: Image width in pixels (defaults to the chart's size at 100 dpi)
+    
+    Returns:
+        PNG bytes, or None if the chart does not apply to the project
+    """
+    with _chart_lock:  # pyplot keeps global state
+        try:
+            if not plot_chart(chart, project_data, results):
+                return None
+            dpi = width / plt.gcf().get_size_inches()[0] if width else None
+            buffer = io.BytesIO()
+            plt.savefig(buffer, format='png', dpi=dpi)
+            return buffer.getvalue()
+        finally:
+            plt.close('all')
+
+
+def generate_visualizations(project_data: Dict, results: Dict, output_dir: str) -> None:
+    """
+    Generate and save visualizations.
+    
+    Args:
+        project_data: Dictionary of project data
+        results: Dictionary of analysis results
+        output_dir: Directory to save visualizations
+    """
+    print("\nGenerating visualizations...")
+    for chart, description in CHARTS.items():
+        if not plot_chart(chart, project_data, results):
+            continue
+        chart_file = os.path.join(output_dir, f"{chart}.png")
+        plt.savefig(chart_file)
+        print(f"  {description} saved to {chart_file}")
         plt.close()
 
 
@@ -267,9 +573,19 @@ def print_introduction():
 def main():
     print_introduction()
     
+    # A directory is analyzed as a portfolio (see batch.py for the options)
+    if len(sys.argv) > 1 and os.path.isdir(sys.argv[1]):
+        import batch
+        batch.main(sys.argv[1:])
+        return
+    
+    # --verbose prints every path's metrics for every period
+    args = [arg for arg in sys.argv[1:] if arg != '--verbose']
+    verbose = len(args) < len(sys.argv) - 1
+    
     # Check if Excel file is provided
-    if len(sys.argv) > 1:
-        excel_file = sys.argv[1]
+    if args:
+        excel_file = args[0]
         # Don't prompt for project name in non-interactive mode
         project_name = os.path.splitext(os.path.basename(excel_file))[0]
     else:
@@ -278,7 +594,7 @@ def main():
         
         if not excel_files:
             print("No Excel files found. Please provide an Excel file path.")
-            print("Usage: python main.py [path_to_excel_file]")
+            print("Usage: python main.py [path_to_excel_file] [--verbose]")
             sys.exit(1)
         
         if len(excel_files) == 1:
@@ -294,7 +610,7 @@ def main():
     
     # Analyze project
     try:
-        analyze_project(excel_file, output_dir, project_name)
+        analyze_project(excel_file, output_dir, project_name, verbose=verbose)
         print("\nAnalysis complete! Results and visualizations saved to the 'results' directory.")
         print("The database file 'es_analysis.db' contains all historical analyses.")
         print("\nThe AI Agent has successfully analyzed the Critical Path and Earned Schedule of your project.")
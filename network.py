@@ -0,0 +1,215 @@
+"""Activity network (DAG) analysis for deriving longest and near-critical paths."""
+from collections import deque
+from typing import Dict, List, Tuple, Optional
+
+
+def normalize_activity_id(value) -> str:
+    """Normalize an activity ID cell (Excel stores plain numbers as floats)"""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def read_network_sheet(sheet) -> Tuple[Dict[str, float], Dict[str, List[str]]]:
+    """
+    Read activities and predecessor links from a 'Network' worksheet.
+
+    Expected layout, with a header in row 1:
+      - Column A: Activity ID
+      - Column B: Duration
+      - Column C: Predecessor IDs separated by commas (optional)
+
+    Args:
+        sheet: openpyxl worksheet
+
+    Returns:
+        Tuple of (activity durations, activity predecessors)
+    """
+    durations = {}
+    predecessors = {}
+
+    for row in sheet.iter_rows(min_row=2, max_col=3, values_only=True):
+        if not row or row[0] is None:  # Skip empty rows
+            continue
+        activity = normalize_activity_id(row[0])
+        duration = row[1] if len(row) > 1 and row[1] is not None else 0
+        preds = row[2] if len(row) > 2 else None
+
+        if activity in durations:
+            raise ValueError(f"Duplicate activity {activity} in Network sheet")
+        durations[activity] = float(duration)
+        if preds is None:
+            predecessors[activity] = []
+        elif isinstance(preds, str):
+            predecessors[activity] = [p.strip() for p in preds.split(',') if p.strip()]
+        else:
+            predecessors[activity] = [normalize_activity_id(preds)]
+
+    return durations, predecessors
+
+
+def topological_order(predecessors: Dict[str, List[str]]) -> List[str]:
+    """
+    Order activities so every activity comes after all of its predecessors.
+
+    Args:
+        predecessors: Dictionary of activity IDs to their predecessor IDs
+
+    Returns:
+        List of activity IDs in topological order
+    """
+    successors = {activity: [] for activity in predecessors}
+    in_degree = {activity: 0 for activity in predecessors}
+
+    for activity, preds in predecessors.items():
+        for pred in preds:
+            if pred not in successors:
+                raise ValueError(f"Activity {activity} has unknown predecessor {pred}")
+            successors[pred].append(activity)
+            in_degree[activity] += 1
+
+    queue = deque(a for a, degree in in_degree.items() if degree == 0)
+    order = []
+    while queue:
+        activity = queue.popleft()
+        order.append(activity)
+        for succ in successors[activity]:
+            in_degree[succ] -= 1
+            if in_degree[succ] == 0:
+                queue.append(succ)
+
+    if len(order) != len(predecessors):
+        cyclic = sorted(a for a, degree in in_degree.items() if degree > 0)
+        raise ValueError(f"Network contains a cycle through activities: {', '.join(cyclic)}")
+
+    return order
+
+
+def analyze_network(durations: Dict[str, float], predecessors: Dict[str, List[str]]) -> Dict:
+    """
+    Run the CPM forward and backward passes over the activity network.
+
+    Both passes are a single dynamic-programming sweep in topological order,
+    so the cost is linear in activities plus links.
+
+    Args:
+        durations: Dictionary of activity IDs to durations
+        predecessors: Dictionary of activity IDs to their predecessor IDs
+
+    Returns:
+        Dictionary with early/late start and finish, total float, the
+        project duration, topological order, successors and the longest path
+    """
+    order = topological_order(predecessors)
+    successors = {activity: [] for activity in order}
+    for activity, preds in predecessors.items():
+        for pred in preds:
+            successors[pred].append(activity)
+
+    # Forward pass
+    early_start = {}
+    early_finish = {}
+    for activity in order:
+        early_start[activity] = max((early_finish[p] for p in predecessors[activity]), default=0.0)
+        early_finish[activity] = early_start[activity] + durations[activity]
+
+    project_duration = max(early_finish.values(), default=0.0)
+
+    # Backward pass
+    late_start = {}
+    late_finish = {}
+    for activity in reversed(order):
+        late_finish[activity] = min((late_start[s] for s in successors[activity]), default=project_duration)
+        late_start[activity] = late_finish[activity] - durations[activity]
+
+    total_float = {a: late_start[a] - early_start[a] for a in order}
+
+    network = {
+        'durations': durations,
+        'predecessors': predecessors,
+        'successors': successors,
+        'order': order,
+        'early_start': early_start,
+        'early_finish': early_finish,
+        'late_start': late_start,
+        'late_finish': late_finish,
+        'total_float': total_float,
+        'project_duration': project_duration
+    }
+
+    # min() keeps the first activity in topological order among equal floats
+    critical = min(order, key=lambda a: total_float[a]) if order else None
+    network['longest_path'] = longest_path_through(network, critical) if critical is not None else []
+
+    return network
+
+
+def longest_path_through(network: Dict, activity: str) -> List[str]:
+    """
+    Trace the longest start-to-finish path that passes through an activity.
+
+    Follows the driving predecessor (latest early finish) backwards and the
+    driving successor (earliest late start) forwards. The path length is
+    the project duration minus the activity's total float.
+
+    Args:
+        network: Result of analyze_network
+        activity: Activity ID the path must pass through
+
+    Returns:
+        List of activity IDs from a start activity to a finish activity
+    """
+    early_finish = network['early_finish']
+    late_start = network['late_start']
+
+    backward = []
+    current = activity
+    while network['predecessors'][current]:
+        current = max(network['predecessors'][current], key=lambda p: early_finish[p])
+        backward.append(current)
+
+    forward = []
+    current = activity
+    while network['successors'][current]:
+        current = min(network['successors'][current], key=lambda s: late_start[s])
+        forward.append(current)
+
+    return backward[::-1] + [activity] + forward
+
+
+def near_critical_paths(network: Dict, float_threshold: float = 0.0,
+                        max_paths: Optional[int] = None) -> Dict[str, List[str]]:
+    """
+    List distinct longest paths through every activity within a float threshold.
+
+    Instead of enumerating all start-to-finish paths, one path is traced
+    through each near-critical activity, in order of increasing float.
+
+    Args:
+        network: Result of analyze_network
+        float_threshold: Maximum total float for an activity to count as near-critical
+        max_paths: Maximum number of paths to return
+
+    Returns:
+        Dictionary of path names ("Path" + hyphen-joined activity IDs) to activity lists,
+        in the same format as the 'paths' entry of project data
+    """
+    total_float = network['total_float']
+    position = {a: i for i, a in enumerate(network['order'])}
+    tolerance = 1e-9  # Floats are sums of durations, allow for rounding
+    candidates = sorted((a for a in network['order'] if total_float[a] <= float_threshold + tolerance),
+                        key=lambda a: (total_float[a], position[a]))
+
+    paths = {}
+    covered = set()
+    for activity in candidates:
+        if max_paths is not None and len(paths) >= max_paths:
+            break
+        if activity in covered:
+            continue
+        path = longest_path_through(network, activity)
+        covered.update(a for a in path if total_float[a] == total_float[activity])
+        name = "Path" + "-".join(path)
+        paths.setdefault(name, path)
+
+    return paths
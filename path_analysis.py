@@ -1,5 +1,7 @@
 """Functions for path-specific ES analysis and critical path selection."""
-from typing import Dict, List, Tuple, Set
+import warnings
+from typing import Dict, List, Tuple, Set, Optional
+import numpy as np
 import es_core
 
 
@@ -37,21 +39,19 @@ def select_controlling_path(path_ieacs: Dict[str, float], path_es_values: Dict[s
     Returns:
         Name of the selected controlling path
     """
-    # Sort paths by IEAC (largest first)
-    sorted_paths = sorted(path_ieacs.keys(), key=lambda p: path_ieacs[p], reverse=True)
+    # Largest IEAC first; max() keeps the first of equal paths, like a stable sort
+    candidate = max(path_ieacs, key=lambda p: path_ieacs[p])
     
     if not prev_controlling or prev_es is None:
         # No previous selection, just take the longest
-        return sorted_paths[0]
+        return candidate
     
     # Check if the new longest path violates the non-decreasing ES rule
-    candidate = sorted_paths[0]
-    
     if candidate != prev_controlling and path_es_values[candidate] < prev_es:
-        # Anomaly detected - ES decreased. Try next best path
-        for path in sorted_paths[1:]:
-            if path_es_values[path] >= prev_es:
-                return path
+        # Anomaly detected - ES decreased. Take the longest path that keeps ES non-decreasing
+        valid = [p for p in path_ieacs if p != candidate and path_es_values[p] >= prev_es]
+        if valid:
+            return max(valid, key=lambda p: path_ieacs[p])
         
         # If all paths have decreasing ES, stick with previous path
         return prev_controlling
@@ -59,6 +59,148 @@ def select_controlling_path(path_ieacs: Dict[str, float], path_es_values: Dict[s
     return candidate
 
 
+def select_controlling_index(period_ieacs: np.ndarray, period_es: np.ndarray,
+                             prev_index: Optional[int] = None, prev_es: Optional[float] = None) -> int:
+    """
+    Array version of select_controlling_path() for one period.
+    
+    Finds the first valid candidate with masked argmax scans instead of
+    sorting all paths. NaN entries (paths without data in this period) are
+    ignored.
+    
+    Args:
+        period_ieacs: IEAC value per path for this period
+        period_es: ES value per path for this period
+        prev_index: Index of the previously controlling path
+        prev_es: ES value of the previously controlling path
+    
+    Returns:
+        Index of the selected controlling path
+    """
+    period_ieacs = np.asarray(period_ieacs, dtype=float)
+    period_es = np.asarray(period_es, dtype=float)
+    available = ~np.isnan(period_ieacs)
+    if not available.any():
+        raise ValueError("No path has data for this period")
+    
+    indices = np.flatnonzero(available)
+    candidate = int(indices[np.argmax(period_ieacs[indices])])
+    
+    if prev_index is None or prev_es is None:
+        return candidate
+    
+    if candidate != prev_index and period_es[candidate] < prev_es:
+        valid = available & (period_es >= prev_es)
+        valid[candidate] = False
+        if valid.any():
+            return int(np.flatnonzero(valid)[np.argmax(period_ieacs[valid])])
+        return prev_index
+    
+    return candidate
+
+
+def top_k_paths(ieac_matrix: np.ndarray, k: int) -> np.ndarray:
+    """
+    Find the k paths with the largest IEAC in every period.
+    
+    Uses np.partition to find each period's k-th largest IEAC, so only the
+    k selected paths are sorted.
+    
+    Args:
+        ieac_matrix: Paths x periods IEAC matrix (NaN where a path has no data)
+        k: Number of near-critical paths to return per period
+    
+    Returns:
+        Periods x k array of path indices ordered by descending IEAC,
+        padded with -1 where fewer than k paths have data
+    """
+    ieac_matrix = np.asarray(ieac_matrix, dtype=float)
+    n_paths, n_periods = ieac_matrix.shape
+    k = min(k, n_paths)
+    if k <= 0:
+        return np.empty((n_periods, 0), dtype=int)
+    
+    available = ~np.isnan(ieac_matrix)
+    keys = np.where(available, -ieac_matrix, np.inf).T  # periods x paths, smallest first
+    if k < n_paths:
+        # Take every path below the k-th smallest key, then the lowest-indexed
+        # paths equal to it (argpartition would break that tie arbitrarily)
+        kth = np.partition(keys, k - 1, axis=1)[:, k - 1:k]
+        below = keys < kth
+        tied = keys == kth
+        selected = below | (tied & (np.cumsum(tied, axis=1) <= k - below.sum(axis=1, keepdims=True)))
+        top = np.nonzero(selected)[1].reshape(n_periods, k)
+    else:
+        top = np.tile(np.arange(n_paths), (n_periods, 1))
+    
+    # Order the k selected paths by IEAC, ties by path order
+    top_keys = np.take_along_axis(keys, top, axis=1)
+    order = np.lexsort((top, top_keys), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    
+    top_available = np.take_along_axis(available.T, top, axis=1)
+    return np.where(top_available, top, -1)
+
+
+def select_controlling_paths(ieac_matrix: np.ndarray, es_matrix: np.ndarray,
+                             switch_factor: float = 1.5) -> Tuple[np.ndarray, List[Tuple[int, int, int]],
+                                                                  Dict[int, Tuple[int, float]]]:
+    """
+    Select the controlling path for every period and flag path-switch anomalies.
+    
+    The longest-path candidates for all periods are found in one vectorized
+    argmax. Only periods where the candidate would break the ES
+    non-decreasing rule need a sequential fallback scan. A switch is an
+    anomaly when the previous controlling path still shows an IEAC more than
+    switch_factor times that of the newly selected path.
+    
+    Args:
+        ieac_matrix: Paths x periods IEAC matrix (NaN where a path has no data)
+        es_matrix: Paths x periods ES matrix
+        switch_factor: IEAC ratio above which a path switch is an anomaly
+    
+    Returns:
+        Tuple of (controlling path index per period,
+                  list of (period, from index, to index) switch events,
+                  dictionary of period to (previous path index, its IEAC) anomalies)
+    """
+    ieac_matrix = np.asarray(ieac_matrix, dtype=float)
+    es_matrix = np.asarray(es_matrix, dtype=float)
+    n_periods = ieac_matrix.shape[1]
+    available = ~np.isnan(ieac_matrix)
+    if not available.any(axis=0).all():
+        raise ValueError("Every period needs data for at least one path")
+    
+    candidates = np.argmax(np.where(available, ieac_matrix, -np.inf), axis=0)
+    candidate_es = es_matrix[candidates, np.arange(n_periods)]
+    
+    controlling = candidates.copy()
+    prev_index = None
+    prev_es = None
+    for period in range(n_periods):
+        candidate = candidates[period]
+        if prev_index is not None and prev_es is not None and candidate != prev_index \
+                and candidate_es[period] < prev_es:
+            controlling[period] = select_controlling_index(
+                ieac_matrix[:, period], es_matrix[:, period], prev_index, prev_es)
+        prev_index = controlling[period]
+        es_value = es_matrix[prev_index, period]
+        prev_es = None if np.isnan(es_value) else es_value
+    
+    switch_periods = np.flatnonzero(controlling[1:] != controlling[:-1]) + 1
+    from_paths = controlling[switch_periods - 1]
+    to_paths = controlling[switch_periods]
+    switches = list(zip(switch_periods.tolist(), from_paths.tolist(), to_paths.tolist()))
+    
+    # If path switched and previous had much higher IEAC, mark as anomaly
+    prev_ieacs = ieac_matrix[from_paths, switch_periods]
+    is_anomaly = prev_ieacs > switch_factor * ieac_matrix[to_paths, switch_periods]
+    anomalies = {int(period): (int(path), float(ieac)) for period, path, ieac in
+                 zip(switch_periods[is_anomaly], from_paths[is_anomaly], prev_ieacs[is_anomaly])}
+    
+    return controlling, switches, anomalies
+
+
 def identify_anomalies(path_ieacs_history: Dict[str, List[float]], 
                       threshold_factor: float = 2.0) -> Dict[str, List[int]]:
     """
@@ -71,21 +213,426 @@ def identify_anomalies(path_ieacs_history: Dict[str, List[float]],
     Returns:
         Dictionary of path names to lists of anomalous periods
     """
+    names = list(path_ieacs_history.keys())
+    width = max((len(ieacs) for ieacs in path_ieacs_history.values()), default=0)
+    ieac_matrix = np.full((len(names), width), np.nan)
+    for row, name in enumerate(names):
+        ieacs = path_ieacs_history[name]
+        ieac_matrix[row, :len(ieacs)] = ieacs
+    
+    spikes = detect_ieac_spikes(ieac_matrix, threshold_factor)
+    
     anomalies = {}
+    for row, periods in enumerate(spikes):
+        if periods.any():
+            anomalies[names[row]] = np.flatnonzero(periods).tolist()
     
-    for path, ieacs in path_ieacs_history.items():
-        path_anomalies = []
-        
-        if len(ieacs) < 3:
-            continue
-            
-        for i in range(1, len(ieacs)-1):
-            # Check for spike - current value much larger than neighbors
-            if (ieacs[i] > threshold_factor * ieacs[i-1] and 
-                ieacs[i] > threshold_factor * ieacs[i+1]):
-                path_anomalies.append(i)
-                
-        if path_anomalies:
-            anomalies[path] = path_anomalies
-            
     return anomalies
+
+
+def _neighbor_spikes(prev: np.ndarray, current: np.ndarray, following: np.ndarray,
+                     threshold_factor: float) -> np.ndarray:
+    """Spike - current value much larger than both neighbors (NaN never spikes)"""
+    return (current > threshold_factor * prev) & (current > threshold_factor * following)
+
+
+def _robust_spikes(current: np.ndarray, reference: np.ndarray, z_threshold: float,
+                   min_reference: int = 3, min_relative: float = 0.1) -> np.ndarray:
+    """
+    Spike - modified z-score of current against a reference window above z_threshold.
+    
+    The scale is 1.4826 * MAD, falling back to 1.2533 * mean absolute
+    deviation when the MAD is zero. A spike must also exceed the median by
+    min_relative of its value, so near-flat histories don't flag noise.
+    Rows with fewer than min_reference valid reference values are never
+    flagged.
+    """
+    enough = (~np.isnan(reference)).sum(axis=-1) >= min_reference
+    spikes = np.zeros(current.shape, dtype=bool)
+    if not enough.any():
+        return spikes
+    
+    reference = reference[enough]
+    value = current[enough]
+    with warnings.catch_warnings():
+        # Infinite IEACs give all-NaN deviations; those rows are simply not flagged
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(reference, axis=-1)
+        deviation = np.abs(reference - median[..., None])
+        scale = 1.4826 * np.nanmedian(deviation, axis=-1)
+        fallback = 1.2533 * np.nanmean(deviation, axis=-1)
+        scale = np.where(scale > 0, scale, fallback)
+        excess = value - median
+        spikes[enough] = (excess > z_threshold * scale) & (excess > min_relative * np.abs(median))
+    return spikes
+
+
+def detect_ieac_spikes(ieac_matrix: np.ndarray, threshold_factor: float = 2.0,
+                       mode: str = 'neighbors', window: int = 5,
+                       z_threshold: float = 3.5) -> np.ndarray:
+    """
+    Flag IEAC spikes for every path and period with array shifts.
+    
+    In 'neighbors' mode a period is a spike when its IEAC exceeds
+    threshold_factor times both neighboring periods (the rule of
+    identify_anomalies). In 'robust' mode it is compared with the median and
+    MAD of the preceding `window` periods plus the following period.
+    
+    Args:
+        ieac_matrix: Paths x periods IEAC matrix (NaN where a path has no data)
+        threshold_factor: Neighbor ratio for 'neighbors' mode
+        mode: 'neighbors' or 'robust'
+        window: Number of preceding periods in the 'robust' reference window
+        z_threshold: Modified z-score threshold for 'robust' mode
+    
+    Returns:
+        Boolean paths x periods matrix, True where a spike was detected
+    """
+    ieac_matrix = np.asarray(ieac_matrix, dtype=float)
+    spikes = np.zeros(ieac_matrix.shape, dtype=bool)
+    if ieac_matrix.shape[1] < 3:
+        return spikes
+    
+    current = ieac_matrix[:, 1:-1]
+    following = ieac_matrix[:, 2:]
+    
+    if mode == 'neighbors':
+        with np.errstate(invalid='ignore'):
+            spikes[:, 1:-1] = _neighbor_spikes(ieac_matrix[:, :-2], current, following, threshold_factor)
+    elif mode == 'robust':
+        # Preceding `window` values for each period, NaN-padded at the start
+        padded = np.concatenate([np.full((ieac_matrix.shape[0], window), np.nan), ieac_matrix], axis=1)
+        preceding = np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)[:, 1:-2]
+        reference = np.concatenate([preceding, following[..., None]], axis=-1)
+        spikes[:, 1:-1] = _robust_spikes(current, reference, z_threshold)
+    else:
+        raise ValueError(f"Unknown spike detection mode: {mode}")
+    
+    return spikes
+
+
+class IEACSpikeDetector:
+    """
+    Streaming IEAC spike detector fed one status period at a time.
+    
+    A period can only be judged once the following period is known, so each
+    update() reports the spikes of the previous period. Results match
+    detect_ieac_spikes() on the complete history.
+    """
+    
+    def __init__(self, path_names: List[str], threshold_factor: float = 2.0,
+                 mode: str = 'neighbors', window: int = 5, z_threshold: float = 3.5):
+        if mode not in ('neighbors', 'robust'):
+            raise ValueError(f"Unknown spike detection mode: {mode}")
+        self.path_names = list(path_names)
+        self.threshold_factor = threshold_factor
+        self.mode = mode
+        self.window = window
+        self.z_threshold = z_threshold
+        # Last window + 2 periods: the reference window, the pending period and its predecessor
+        self.recent = np.full((len(self.path_names), 0), np.nan)
+        self.num_periods = 0
+        self.anomalies = {}
+    
+    def update(self, period_ieacs: Dict[str, float]) -> List[str]:
+        """
+        Add the IEACs of the next period and judge the previous one.
+        
+        Args:
+            period_ieacs: Dictionary of path names to their IEAC this period;
+                          missing paths count as having no data
+        
+        Returns:
+            Names of paths whose IEAC spiked in the previous period
+        """
+        column = np.array([period_ieacs.get(name, np.nan) for name in self.path_names], dtype=float)
+        keep = max(self.window + 1, 2)
+        self.recent = np.concatenate([self.recent[:, -keep:], column[:, None]], axis=1)
+        self.num_periods += 1
+        
+        period = self.num_periods - 2  # The period now followed by a known value
+        if period < 1:
+            return []
+        
+        current = self.recent[:, -2]
+        if self.mode == 'neighbors':
+            with np.errstate(invalid='ignore'):
+                spikes = _neighbor_spikes(self.recent[:, -3], current, column, self.threshold_factor)
+        else:
+            preceding = self.recent[:, -2 - self.window:-2]
+            if preceding.shape[1] < self.window:
+                missing = np.full((len(self.path_names), self.window - preceding.shape[1]), np.nan)
+                preceding = np.concatenate([missing, preceding], axis=1)
+            reference = np.concatenate([preceding, column[:, None]], axis=1)
+            spikes = _robust_spikes(current, reference, self.z_threshold)
+        
+        flagged = [self.path_names[row] for row in np.flatnonzero(spikes)]
+        for name in flagged:
+            self.anomalies.setdefault(name, []).append(period)
+        return flagged
+
+
+def build_path_matrices(path_data: Dict[str, Dict]) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Stack per-path PV/EV series into NaN-padded paths x periods matrices.
+    
+    Args:
+        path_data: Dictionary of path names to {'pv': [...], 'ev': [...]} series
+    
+    Returns:
+        Tuple of (path names, PV matrix, EV matrix); cells beyond a path's
+        own series length are NaN
+    """
+    names = list(path_data.keys())
+    width = max((max(len(d['pv']), len(d['ev'])) for d in path_data.values()), default=0)
+    pv_matrix = np.full((len(names), width), np.nan)
+    ev_matrix = np.full((len(names), width), np.nan)
+    
+    for row, name in enumerate(names):
+        pv = path_data[name]['pv']
+        ev = path_data[name]['ev']
+        pv_matrix[row, :len(pv)] = pv
+        ev_matrix[row, :len(ev)] = ev
+    
+    return names, pv_matrix, ev_matrix
+
+
+def build_metric_matrix(path_metrics: Dict[str, List[Tuple]], names: List[str], metric: int,
+                        num_periods: int) -> np.ndarray:
+    """
+    Stack one metric of per-path (ES, SPI(t), SV(t), IEAC(t)) lists into a paths x periods matrix.
+    
+    Args:
+        path_metrics: Dictionary of path names to per-period metric tuples
+        names: Path names, one per row
+        metric: Index of the metric in the tuples (0 ES, 1 SPI(t), 2 SV(t), 3 IEAC(t))
+        num_periods: Number of columns
+    
+    Returns:
+        Matrix with NaN beyond each path's history
+    """
+    matrix = np.full((len(names), num_periods), np.nan)
+    for row, name in enumerate(names):
+        values = [m[metric] for m in path_metrics[name][:num_periods]]
+        matrix[row, :len(values)] = values
+    return matrix
+
+
+def compute_path_es_matrices(pv_matrix: np.ndarray, ev_matrix: np.ndarray,
+                             planned_duration: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute ES metrics for every path and period in one vectorized pass.
+    
+    Each row is one path. Series of different lengths are right-padded with
+    NaN; padded EV cells produce NaN metrics. Valid cells give the same
+    results as compute_path_es_metrics().
+    
+    Args:
+        pv_matrix: Paths x periods cumulative PV matrix
+        ev_matrix: Paths x periods cumulative EV matrix
+        planned_duration: Planned duration
+    
+    Returns:
+        Tuple of paths x periods matrices (ES(L), SPI(t), SV(t), IEAC(t))
+    """
+    pv = np.asarray(pv_matrix, dtype=float)
+    ev = np.asarray(ev_matrix, dtype=float)
+    n_paths, n_periods = ev.shape
+    
+    pv_valid = ~np.isnan(pv)
+    ev_valid = ~np.isnan(ev)
+    pv_len = pv_valid.sum(axis=1)
+    
+    # Per-row binary search: count the PV running maxima <= each EV by
+    # merging both value sets in one sort, PV sorting before EV on ties
+    pv_max = np.fmax.accumulate(pv, axis=1)
+    pv_rows, pv_cols = np.nonzero(pv_valid)
+    ev_rows, ev_cols = np.nonzero(ev_valid)
+    rows = np.concatenate([pv_rows, ev_rows])
+    values = np.concatenate([pv_max[pv_rows, pv_cols], ev[ev_rows, ev_cols]])
+    is_pv = np.concatenate([np.ones(len(pv_rows), dtype=bool), np.zeros(len(ev_rows), dtype=bool)])
+    order = np.lexsort((~is_pv, values, rows))
+    
+    pv_seen = np.cumsum(is_pv[order])
+    row_start = np.concatenate([[0], np.cumsum(pv_len)[:-1]])
+    counts = pv_seen - row_start[rows[order]]
+    ev_positions = order[~is_pv[order]] - len(pv_rows)
+    
+    count = np.zeros(ev.shape, dtype=int)
+    count[ev_rows[ev_positions], ev_cols[ev_positions]] = counts[~is_pv[order]]
+    
+    n = np.maximum(count - 1, 0)
+    last = (pv_len - 1)[:, None]
+    below_first = ev_valid & (count == 0)
+    beyond_last = ev_valid & ~below_first & (n >= last)
+    between = ev_valid & ~below_first & ~beyond_last
+    
+    es = np.where(ev_valid, n.astype(float), np.nan)
+    
+    # EV is less than first PV
+    r, c = np.nonzero(below_first)
+    first_pv = pv[r, 0]
+    has_pv = first_pv > 0
+    es[r, c] = np.where(has_pv, ev[r, c] / np.where(has_pv, first_pv, 1.0), 0.0)
+    
+    # Interpolate between periods
+    r, c = np.nonzero(between)
+    idx = n[r, c]
+    prev_pv = pv[r, idx]
+    next_pv = pv[r, idx + 1]
+    denom = np.where(next_pv > prev_pv, next_pv - prev_pv, 1.0)  # Avoid division by zero
+    es[r, c] = idx + (ev[r, c] - prev_pv) / denom
+    
+    # Compute SPI(t) and SV(t)
+    at = np.arange(n_periods, dtype=float)
+    spi_t = np.where(ev_valid, 1.0, np.nan)  # Define SPI=1 at t=0
+    spi_t[:, 1:] = es[:, 1:] / at[1:]
+    sv_t = es - at
+    
+    ieac_t = np.full(ev.shape, np.nan)
+    ieac_t[ev_valid] = es_core.compute_ieac_series(planned_duration, spi_t[ev_valid])
+    
+    return es, spi_t, sv_t, ieac_t
+
+
+def ieac_upper_bounds(pv_matrix: np.ndarray, ev_matrix: np.ndarray, planned_duration: float,
+                      search_steps: Optional[int] = None) -> np.ndarray:
+    """
+    Cheap upper bounds on every path's IEAC(t) without the full ES search.
+    
+    A vectorized binary search over each row's running-maximum PV narrows
+    down N, the last period whose PV is covered by EV(t). ES(t) is at least
+    the lowest N still possible; once N is pinned down, ES(t) is exactly N
+    plus the interpolated fraction of the way to PV[N + 1]. This gives a
+    lower bound on ES and so an upper bound PD / (ES / t) on IEAC(t) in a
+    few gathers per step instead of a sort of all values. The bound is
+    infinite only where ES(t) is 0.
+    
+    Args:
+        pv_matrix: Paths x periods cumulative PV matrix (NaN-padded)
+        ev_matrix: Paths x periods cumulative EV matrix (NaN-padded)
+        planned_duration: Planned duration
+        search_steps: Binary search steps (defaults to enough to pin down N;
+                      fewer steps give a looser bound)
+    
+    Returns:
+        Paths x periods matrix of IEAC(t) upper bounds (NaN where a path has no data)
+    """
+    pv = np.asarray(pv_matrix, dtype=float)
+    ev = np.asarray(ev_matrix, dtype=float)
+    n_paths, n_periods = ev.shape
+    pv_periods = pv.shape[1]
+    pv_max = np.fmax.accumulate(pv, axis=1)
+    last = (~np.isnan(pv)).sum(axis=1) - 1  # Last period with PV data
+    row_start = (np.arange(n_paths) * pv_periods)[:, None]
+    
+    # lo: a period known to be covered; hi: one past the last period that may be
+    with np.errstate(invalid='ignore'):
+        covered_first = pv_max[:, :1] <= ev
+    lo = np.zeros(ev.shape, dtype=np.intp)
+    hi = np.repeat((last + 1)[:, None], n_periods, axis=1)
+    if search_steps is None:
+        search_steps = max(pv_periods, 1).bit_length()
+    for _ in range(search_steps):
+        mid = (lo + hi) >> 1
+        with np.errstate(invalid='ignore'):
+            covered = (mid < hi) & (pv_max.take(row_start + np.minimum(mid, pv_periods - 1)) <= ev)
+        lo = np.where(covered, mid, lo)
+        hi = np.where(covered, hi, np.maximum(mid, lo + 1))
+    
+    # Same expressions as compute_path_es_matrices where N is known exactly
+    es_lower = lo.astype(float)
+    exact = (hi == lo + 1) & (lo < last[:, None])
+    prev_pv = pv.take(row_start + lo)
+    next_pv = pv.take(row_start + np.minimum(lo + 1, pv_periods - 1))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        denom = np.where(next_pv > prev_pv, next_pv - prev_pv, 1.0)
+        es_lower = np.where(exact, lo + (ev - prev_pv) / denom, es_lower)
+        first_pv = pv[:, :1]
+        below_first = np.where(first_pv > 0, ev / np.where(first_pv > 0, first_pv, 1.0), 0.0)
+    es_lower = np.where(covered_first, es_lower, below_first)
+    
+    # Computed like IEAC(t) = PD / SPI(t) so an exact ES gives exactly the same value
+    at = np.arange(n_periods, dtype=float)
+    bounds = np.full(ev.shape, np.inf)
+    with np.errstate(invalid='ignore'):
+        bounds[:, 1:] = es_core.compute_ieac_series(planned_duration, es_lower[:, 1:] / at[1:])
+    bounds[:, 0] = planned_duration  # SPI(t) is defined as 1 at t=0
+    bounds[np.isnan(ev)] = np.nan
+    return bounds
+
+
+def compute_pruned_path_es_matrices(pv_matrix: np.ndarray, ev_matrix: np.ndarray, planned_duration: float,
+                                    initial_k: int = 8, num_periods: Optional[int] = None
+                                    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Compute full ES metrics only for paths that could become controlling.
+    
+    Starts with the paths whose IEAC upper bound ranks in the top initial_k
+    of any period, selects the controlling paths among them, and adds every
+    other path whose bound could beat the selected path's IEAC in some
+    period.
+    Periods where the ES rule kept the previous path for lack of a valid
+    alternative add all remaining paths. This repeats until no pruned path
+    could change the selection, so select_controlling_paths() on the pruned
+    matrices gives the same controlling paths and anomalies as on the full
+    ones.
+    
+    Args:
+        pv_matrix: Paths x periods cumulative PV matrix (NaN-padded)
+        ev_matrix: Paths x periods cumulative EV matrix (NaN-padded)
+        planned_duration: Planned duration
+        initial_k: Paths per period in the initial candidate set
+        num_periods: Number of leading periods the controlling paths are
+                     selected over (default: all); later columns, e.g. PV
+                     past the last EV period, are computed but not selected
+    
+    Returns:
+        Tuple of paths x periods matrices (ES(L), SPI(t), SV(t), IEAC(t)),
+        all NaN on pruned rows, and a boolean mask of computed paths
+    """
+    pv = np.asarray(pv_matrix, dtype=float)
+    ev = np.asarray(ev_matrix, dtype=float)
+    n_paths = ev.shape[0]
+    n_periods = ev.shape[1] if num_periods is None else min(num_periods, ev.shape[1])
+    bounds = ieac_upper_bounds(pv, ev, planned_duration)[:, :n_periods]
+    
+    computed = np.zeros(n_paths, dtype=bool)
+    top = top_k_paths(bounds, initial_k)
+    computed[top[top >= 0]] = True
+    
+    es = np.full(ev.shape, np.nan)
+    spi_t = np.full(ev.shape, np.nan)
+    sv_t = np.full(ev.shape, np.nan)
+    ieac_t = np.full(ev.shape, np.nan)
+    pending = computed.copy()
+    
+    while True:
+        rows = np.flatnonzero(pending)
+        if len(rows):
+            es[rows], spi_t[rows], sv_t[rows], ieac_t[rows] = compute_path_es_matrices(
+                pv[rows], ev[rows], planned_duration)
+        
+        selected_ieac, selected_es = ieac_t[:, :n_periods], es[:, :n_periods]
+        controlling, _, _ = select_controlling_paths(selected_ieac, selected_es)
+        periods = np.arange(n_periods)
+        threshold = selected_ieac[controlling, periods]
+        
+        # Periods where the ES rule kept the previous path with no valid alternative
+        candidates = np.argmax(np.where(np.isnan(selected_ieac), -np.inf, selected_ieac), axis=0)
+        prev_es = np.concatenate([[np.nan], selected_es[controlling[:-1], periods[:-1]]])
+        kept = np.zeros(n_periods, dtype=bool)
+        kept[1:] = controlling[1:] == controlling[:-1]
+        with np.errstate(invalid='ignore'):
+            kept &= (controlling != candidates) & (selected_es[controlling, periods] < prev_es)
+        threshold = np.where(kept | np.isnan(threshold), -np.inf, threshold)
+        
+        # Equal IEACs go to the lower path index, as in select_controlling_paths
+        with np.errstate(invalid='ignore'):
+            wins_tie = np.arange(n_paths)[:, None] < controlling[None, :]
+            reachable = ((bounds > threshold) | ((bounds == threshold) & wins_tie)).any(axis=1)
+        pending = reachable & ~computed
+        if not pending.any():
+            return es, spi_t, sv_t, ieac_t, computed
+        computed |= pending
+
@@ -0,0 +1,249 @@
+"""On-disk cache of parsed project workbooks, keyed by content hash."""
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, date
+from typing import Dict, Optional
+
+import numpy as np
+
+import data_handler
+import network
+
+CACHE_FORMAT_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+DEFAULT_MAX_SIZE_MB = 512
+DEFAULT_MAX_AGE_DAYS = 30
+MARKER_KEYS = ('downtime', 'stopwork', 'pv_violations')
+
+
+def file_content_hash(filename: str, chunk_size: int = 1 << 20) -> str:
+    """Return the SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_project_data_cached(filename: str, cache_dir: Optional[str] = None,
+                             max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+                             max_age_days: float = DEFAULT_MAX_AGE_DAYS,
+                             network_float_threshold: float = 0.0) -> Dict:
+    """
+    Load project data, reusing the parsed arrays when the workbook is unchanged.
+
+    The cache key is the SHA-256 of the workbook contents plus the loading
+    parameters. On a hit no Excel parsing happens: the PV/EV series come back
+    as read-only NumPy arrays memory-mapped from .npy files instead of lists.
+    Raw path series are not cached; their 'raw_pv'/'raw_ev' are the processed
+    values, as for simulated paths.
+
+    Args:
+        filename: Path to Excel file
+        cache_dir: Cache directory (defaults to 'cache' next to this module)
+        max_size_mb: Total cache size above which least recently used entries are evicted
+        max_age_days: Entries not used for this long are evicted
+        network_float_threshold: Passed to data_handler.load_project_data
+
+    Returns:
+        Dictionary containing project data, as from data_handler.load_project_data,
+        plus 'content_hash', the workbook's SHA-256 hex digest
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    content_hash = file_content_hash(filename)
+    key_source = f"{content_hash}:{network_float_threshold!r}:{CACHE_FORMAT_VERSION}"
+    key = hashlib.sha256(key_source.encode()).hexdigest()
+    entry_dir = os.path.join(cache_dir, key)
+
+    if os.path.isdir(entry_dir):
+        try:
+            project_data = _read_entry(entry_dir)
+            os.utime(entry_dir)  # Mark as recently used for eviction
+            project_data['content_hash'] = content_hash
+            return project_data
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(entry_dir, ignore_errors=True)  # Corrupt entry, rebuild it
+
+    project_data = data_handler.load_project_data(filename, network_float_threshold)
+    _write_entry(cache_dir, entry_dir, project_data)
+    evict(cache_dir, max_size_mb, max_age_days)
+    project_data['content_hash'] = content_hash
+    return project_data
+
+
+def _encode_value(value):
+    """Make a cell value JSON-safe, keeping dates recognizable"""
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    """Inverse of _encode_value"""
+    if isinstance(value, dict) and 'datetime' in value:
+        return datetime.fromisoformat(value['datetime'])
+    if isinstance(value, dict) and 'date' in value:
+        return date.fromisoformat(value['date'])
+    return value
+
+
+def _marker_mask(raw_values) -> np.ndarray:
+    """Boolean mask of "XX" markers in a raw series"""
+    return np.array([value == "XX" for value in raw_values], dtype=bool)
+
+
+def _write_entry(cache_dir: str, entry_dir: str, project_data: Dict) -> None:
+    """Write project data as one .npy file per column plus a JSON manifest"""
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = os.path.join(cache_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+
+    path_names = list(project_data['path_data'].keys())
+    pv_lengths = [len(project_data['path_data'][p]['pv']) for p in path_names]
+    ev_lengths = [len(project_data['path_data'][p]['ev']) for p in path_names]
+    width = max(pv_lengths + ev_lengths, default=0)
+
+    columns = {
+        'pv_series': np.asarray(project_data['pv_series'], dtype=float),
+        'ev_series': np.asarray(project_data['ev_series'], dtype=float),
+        'pv_markers': _marker_mask(project_data['raw_pv']),
+        'ev_markers': _marker_mask(project_data['raw_ev']),
+        'path_pv': np.full((len(path_names), width), np.nan),
+        'path_ev': np.full((len(path_names), width), np.nan),
+    }
+    for row, name in enumerate(path_names):
+        data = project_data['path_data'][name]
+        columns['path_pv'][row, :pv_lengths[row]] = data['pv']
+        columns['path_ev'][row, :ev_lengths[row]] = data['ev']
+
+    task_data = project_data.get('task_data')
+    if task_data is not None:
+        columns['task_pv'] = task_data['pv']
+        columns['task_ev'] = task_data['ev']
+
+    for name, array in columns.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+
+    net = project_data.get('network')
+    manifest = {
+        'version': CACHE_FORMAT_VERSION,
+        'planned_duration': project_data['planned_duration'],
+        'start_date': _encode_value(project_data['start_date']),
+        'downtime': project_data['downtime'],
+        'stopwork': project_data['stopwork'],
+        'pv_violations': project_data.get('pv_violations', []),
+        'path_markers': {name: {key: data[key] for key in MARKER_KEYS if key in data}
+                         for name, data in project_data['path_data'].items()},
+        'paths': project_data['paths'],
+        'path_names': path_names,
+        'pv_lengths': pv_lengths,
+        'ev_lengths': ev_lengths,
+        'task_ids': task_data['task_ids'] if task_data is not None else None,
+        'network': {'durations': net['durations'], 'predecessors': net['predecessors']} if net else None
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), 'w') as f:
+        json.dump(manifest, f)
+
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)  # Another process stored it first
+
+
+def _read_entry(entry_dir: str) -> Dict:
+    """Read a cache entry written by _write_entry"""
+    with open(os.path.join(entry_dir, "manifest.json")) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != CACHE_FORMAT_VERSION:
+        raise ValueError("Cache entry has an old format")
+
+    def column(name):
+        return np.load(os.path.join(entry_dir, f"{name}.npy"), mmap_mode='r')
+
+    def raw(values, markers):
+        return ["XX" if marker else float(value) for value, marker in zip(values, markers)]
+
+    pv_series = column('pv_series')
+    ev_series = column('ev_series')
+
+    path_pv = column('path_pv')
+    path_ev = column('path_ev')
+    path_data = {}
+    for row, name in enumerate(manifest['path_names']):
+        pv = path_pv[row, :manifest['pv_lengths'][row]]
+        ev = path_ev[row, :manifest['ev_lengths'][row]]
+        path_data[name] = {
+            'pv': pv,
+            'ev': ev,
+            'raw_pv': pv,
+            'raw_ev': ev
+        }
+        path_data[name].update(manifest['path_markers'][name])
+
+    task_data = None
+    if manifest['task_ids'] is not None:
+        task_data = {'task_ids': manifest['task_ids'], 'pv': column('task_pv'), 'ev': column('task_ev')}
+
+    network_result = None
+    if manifest['network']:
+        network_result = network.analyze_network(manifest['network']['durations'],
+                                                 manifest['network']['predecessors'])
+
+    return {
+        'pv_series': pv_series,
+        'ev_series': ev_series,
+        'raw_pv': raw(pv_series, column('pv_markers')),
+        'raw_ev': raw(ev_series, column('ev_markers')),
+        'downtime': manifest['downtime'],
+        'stopwork': manifest['stopwork'],
+        'pv_violations': manifest['pv_violations'],
+        'planned_duration': manifest['planned_duration'],
+        'start_date': _decode_value(manifest['start_date']),
+        'paths': manifest['paths'],
+        'path_data': path_data,
+        'network': network_result,
+        'task_data': task_data
+    }
+
+
+def evict(cache_dir: Optional[str] = None, max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+          max_age_days: float = DEFAULT_MAX_AGE_DAYS) -> int:
+    """
+    Remove cache entries unused for max_age_days, then least recently used
+    entries until the cache fits in max_size_mb.
+
+    Returns:
+        Number of entries removed
+    """
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith('.') or not os.path.isdir(path):
+            continue
+        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        entries.append((os.path.getmtime(path), size, path))
+
+    entries.sort()  # Least recently used first
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+    max_bytes = max_size_mb * 1024 * 1024
+    removed = 0
+
+    for used_at, size, path in entries:
+        if now - used_at <= max_age_days * 86400 and total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+
+    return removed
@@ -0,0 +1,39 @@
+"""Regression checks for opening the analysis database"""
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+NUM_PROCESSES = 6
+
+
+def _open_db(db_paths, barrier, versions):
+    for db_path in db_paths:
+        barrier.wait()  # Open each database in every process at the same moment
+        try:
+            db = database.ESDatabase(db_path)
+            versions.put(db.conn.execute("PRAGMA user_version").fetchone()[0])
+            db.close()
+        except Exception as e:
+            versions.put(repr(e))
+
+
+def test_new_database_opened_by_several_processes(tmp_path):
+    """Processes creating the same new database at once all open and migrate it"""
+    context = multiprocessing.get_context("spawn")
+    db_paths = [str(tmp_path / f"es_{attempt}.db") for attempt in range(20)]
+    barrier = context.Barrier(NUM_PROCESSES, timeout=60)
+    versions = context.Queue()
+    processes = [context.Process(target=_open_db, args=(db_paths, barrier, versions))
+                 for _ in range(NUM_PROCESSES)]
+    for process in processes:
+        process.start()
+    results = [versions.get(timeout=60) for _ in range(NUM_PROCESSES * len(db_paths))]
+    for process in processes:
+        process.join()
+
+    assert [process.exitcode for process in processes] == [0] * NUM_PROCESSES
+    assert results == [database.SCHEMA_VERSION] * len(results)
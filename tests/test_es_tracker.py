@@ -0,0 +1,18 @@
+"""Regression checks for incremental Earned Schedule tracking"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import es_tracker
+
+
+def test_controlling_path_stays_aligned_with_periods():
+    """Periods after the path EV ends still get a controlling_path entry"""
+    tracker = es_tracker.EarnedScheduleTracker([1, 2, 3, 4], 4, {'A': [1, 2, 3, 4], 'B': [1, 2, 2, 4]})
+    tracker.append_period(0.5, {'A': 0.5, 'B': 0.4})
+    tracker.append_period(1.5, {'A': 1.5, 'B': 1.2})
+    tracker.append_period(2.0)
+    results = tracker.results
+    assert len(results['controlling_path']) == len(results['overall_metrics']) == 3
+    assert results['controlling_path'][2] is None
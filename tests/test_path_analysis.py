@@ -0,0 +1,45 @@
+"""Regression checks for path selection and pruning"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import path_analysis
+
+
+def _paths_with_pv_past_ev(n_paths=40, pv_periods=14, ev_periods=9, seed=3):
+    """Path data whose PV series run past the last EV period, as from a long Task PV sheet"""
+    rng = np.random.default_rng(seed)
+    path_data = {}
+    for i in range(n_paths):
+        pv = np.cumsum(rng.uniform(0.5, 2.0, pv_periods))
+        ev = np.interp(np.arange(ev_periods) * rng.uniform(0.6, 1.1), np.arange(pv_periods), pv)
+        path_data[f"P{i}"] = {'pv': pv.tolist(), 'ev': ev.tolist()}
+    return path_data, ev_periods
+
+
+def test_pruning_with_pv_longer_than_ev():
+    """Pruned selection over the EV periods matches the full one"""
+    path_data, num_periods = _paths_with_pv_past_ev()
+    _, pv, ev = path_analysis.build_path_matrices(path_data)
+    es, _, _, ieac = path_analysis.compute_path_es_matrices(pv, ev, 12.0)
+    expected = path_analysis.select_controlling_paths(ieac[:, :num_periods], es[:, :num_periods])
+
+    es, _, _, ieac, computed = path_analysis.compute_pruned_path_es_matrices(
+        pv, ev, 12.0, initial_k=2, num_periods=num_periods)
+    controlling, switches, anomalies = path_analysis.select_controlling_paths(
+        ieac[:, :num_periods], es[:, :num_periods])
+
+    assert not computed.all()
+    assert controlling.tolist() == expected[0].tolist()
+    assert switches == expected[1]
+    assert anomalies == expected[2]
+
+
+
+def test_top_k_paths_breaks_ties_by_path_order():
+    """Paths tied at the k-th place are taken in path order"""
+    ieac = np.array([[5.0], [9.0], [1.0], [5.0], [2.0], [9.0], [5.0]])
+    assert path_analysis.top_k_paths(ieac, 3).tolist() == [[1, 5, 0]]
@@ -3,13 +3,15 @@
 import os
 import json
 import base64
+import hashlib
+import zlib
 from typing import Dict, List, Any
 from datetime import datetime
-from flask import Flask, request, render_template, jsonify, send_from_directory
+from flask import Flask, Response, request, render_template, jsonify, send_from_directory
 import matplotlib.pyplot as plt
 import io
-import threading
-import time
+import shutil
+from werkzeug.utils import secure_filename
 
 # Import our modules
 import es_core
@@ -17,19 +19,32 @@ import path_analysis
 import data_handler
 import visualization
 import database
-from main import analyze_project
+import jobs
+import chart_cache
+from main import analyze_project, analysis_input_hash, available_charts, load_project_input, render_chart
 
 app = Flask(__name__)
 
-# Global variable to store analysis status
-analysis_status = {
-    "in_progress": False,
-    "progress": 0,
-    "message": "",
-    "completed": False,
-    "error": None,
-    "results": None
-}
+# Bounded pool of analysis workers; each upload is a job with its own ID
+MAX_ANALYSIS_WORKERS = 2
+JOB_TTL_SECONDS = 3600
+EVENT_KEEPALIVE_SECONDS = 15
+
+# /api/analyze answers uploads up to this size in the request; larger ones become jobs
+API_SYNC_MAX_BYTES = 2 * 1024 * 1024
+API_ARTIFACTS = ("excel", "charts")
+
+# Columnar results payload: top-level fields and the per-period metric arrays
+RESULT_FIELDS = ("num_periods", "overall_metrics", "controlling_path", "path_metrics", "anomalies",
+                 "images", "final_path", "final_ieac", "job_id", "excel_url", "project_id", "analysis_id")
+RESULT_METRICS = ("es", "spi_t", "sv_t", "ieac_t")
+DEFLATE_MIN_BYTES = 1024  # Smaller responses are sent uncompressed
+
+# Charts are rendered when first requested and kept in an LRU cache
+CHART_CACHE_SIZE_MB = 64
+CHART_MAX_WIDTH = 4000
+rendered_charts = chart_cache.ChartCache(CHART_CACHE_SIZE_MB)
+job_queue = jobs.JobQueue(MAX_ANALYSIS_WORKERS, JOB_TTL_SECONDS)
 
 @app.route('/')
 def index():
@@ -38,19 +53,7 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload and start analysis"""
-    global analysis_status
-    
-    # Reset status
-    analysis_status = {
-        "in_progress": False,
-        "progress": 0,
-        "message": "",
-        "completed": False,
-        "error": None,
-        "results": None
-    }
-    
+    """Handle file upload and queue its analysis"""
     # Check if a file was uploaded
     if 'file' not in request.files:
         return jsonify({"error": "No file uploaded"}), 400
@@ -62,107 +65,259 @@ def upload_file():
     if not file.filename.endswith('.xlsx'):
         return jsonify({"error": "Only Excel (.xlsx) files are supported"}), 400
     
-    # Save the file
-    upload_dir = os.path.join(app.root_path, 'uploads')
+    filename = secure_filename(file.filename) or "upload.xlsx"
+    job = job_queue.create(os.path.splitext(os.path.basename(file.filename))[0])
+    
+    # Save the file, in a directory of its own so concurrent uploads don't collide
+    upload_dir = os.path.join(app.root_path, 'uploads', job.id)
+    output_dir = os.path.join(app.root_path, 'results', job.id)
     os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, file.filename)
+    file_path = os.path.join(upload_dir, filename)
     file.save(file_path)
+    job.cleanup.append(lambda: shutil.rmtree(upload_dir, ignore_errors=True))
+    job.cleanup.append(lambda: shutil.rmtree(output_dir, ignore_errors=True))
     
-    # Start analysis in background thread
-    threading.Thread(target=run_analysis, args=(file_path,)).start()
+    # Queue analysis on the worker pool
+    job_queue.submit(job, run_analysis, file_path, output_dir)
     
-    return jsonify({"message": "Analysis started"})
+    return jsonify({"message": "Analysis queued", "job_id": job.id})
 
-@app.route('/status')
-def get_status():
-    """Return the current status of the analysis"""
-    global analysis_status
-    return jsonify(analysis_status)
+@app.route('/api/analyze', methods=['POST'])
+def api_analyze():
+    """
+    Analyze a workbook held in memory and return its metrics as JSON.
+    
+    The workbook is the 'file' field of a multipart form or the raw request
+    body. Options (query string or form fields):
+        name: Project name (defaults to the file name)
+        artifacts: Comma-separated outputs to write, from "excel" and "charts"
+                   (default: none; nothing is written to disk)
+        near_critical_k: Number of near-critical paths per period (default 3)
+        prune_paths: "true" to skip paths that cannot become controlling
+        store: "true" to store the analysis in the database
+    
+    Uploads up to API_SYNC_MAX_BYTES are analyzed in the request; larger ones
+    are queued and answered with 202 and the job's status URLs.
+    """
+    options = request.values
+    upload = request.files.get('file')
+    if upload is not None:
+        filename = upload.filename or "upload.xlsx"
+        data = upload.read()
+    else:
+        filename = options.get('filename', "upload.xlsx")
+        data = request.get_data(cache=False)
+    if not data:
+        return jsonify({"error": "No workbook in request"}), 400
+    
+    artifacts = [a.strip() for a in options.get('artifacts', '').split(',') if a.strip()]
+    unknown = [a for a in artifacts if a not in API_ARTIFACTS]
+    if unknown:
+        return jsonify({"error": f"Unknown artifacts: {', '.join(unknown)}"}), 400
+    try:
+        near_critical_k = int(options.get('near_critical_k', 3))
+    except ValueError:
+        return jsonify({"error": "near_critical_k must be an integer"}), 400
+    if near_critical_k < 1:
+        return jsonify({"error": "near_critical_k must be at least 1"}), 400
+    settings = {
+        "artifacts": artifacts,
+        "near_critical_k": near_critical_k,
+        "prune_paths": options.get('prune_paths', '').lower() in ('1', 'true', 'yes'),
+        "store": options.get('store', '').lower() in ('1', 'true', 'yes'),
+    }
+    
+    job = job_queue.create(options.get('name') or os.path.splitext(os.path.basename(filename))[0])
+    output_dir = os.path.join(app.root_path, 'results', job.id)
+    job.cleanup.append(lambda: shutil.rmtree(output_dir, ignore_errors=True))
+    
+    if len(data) > API_SYNC_MAX_BYTES:
+        job_queue.submit(job, analyze_upload, data, secure_filename(filename), output_dir, settings)
+        return jsonify({
+            "job_id": job.id,
+            "status_url": f"/status/{job.id}",
+            "events_url": f"/events/{job.id}",
+            "results_url": f"/results/{job.id}"
+        }), 202
+    
+    job_queue.run(job, analyze_upload, data, secure_filename(filename), output_dir, settings)
+    if not artifacts:
+        # Nothing refers back to the job, so its results are not kept for the TTL
+        job_queue.remove(job)
+        if job.results:
+            del job.results["job_id"]
+    if job.error:
+        return jsonify({"error": job.error}), 422
+    try:
+        payload = select_results(job.results, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return results_response(payload)
 
-@app.route('/results')
-def get_results():
-    """Return the analysis results"""
-    global analysis_status
+@app.route('/status/<job_id>')
+def get_status(job_id):
+    """Return the current status of an analysis job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.to_status())
+
+@app.route('/events/<job_id>')
+def stream_status(job_id):
+    """Stream a job's status as Server-Sent Events until the job finishes"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    
+    def events():
+        version = -1  # Send the current status straight away
+        while True:
+            if job.wait_for_change(version, EVENT_KEEPALIVE_SECONDS) == version:
+                yield ": keepalive\n\n"  # Comment line; keeps proxies from closing the stream
+                continue
+            status = job.to_status()
+            version = status["version"]
+            yield f"data: {json.dumps(status)}\n\n"
+            if status["completed"]:
+                return
     
-    if not analysis_status["completed"]:
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/results/<job_id>')
+def get_results(job_id):
+    """
+    Return the results of an analysis job in the columnar layout of prepare_results_for_json.
+    
+    Query parameters narrow the payload (see select_results). Responses carry
+    an ETag, so a client revalidating with If-None-Match gets 304.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    
+    if not job.finished:
         return jsonify({"error": "Analysis not completed yet"}), 400
     
-    if analysis_status["error"]:
-        return jsonify({"error": analysis_status["error"]}), 500
+    if job.error:
+        return jsonify({"error": job.error}), 500
     
-    return jsonify(analysis_status["results"])
+    try:
+        payload = select_results(job.results, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Results never change once the job finished, so the job and query identify them
+    query = sorted((name, request.args.get(name)) for name in ('fields', 'paths', 'metrics', 'controlling_only'))
+    etag = hashlib.sha256(f"{job.id}:{job.version}:{query}".encode()).hexdigest()[:32]
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return results_response(payload, etag)
 
 @app.route('/results/images/<path:filename>')
 def get_image(filename):
-    """Serve image files"""
+    """
+    Serve a job's chart, rendering it on first request, or another result file.
+    
+    Charts are requested as <job_id>/<chart>.png, optionally with ?width= in
+    pixels; they are cached per analysis, chart and width.
+    """
+    job_id, _, name = filename.partition('/')
+    chart = name[:-len('.png')] if name.endswith('.png') else None
+    job = job_queue.get(job_id) if chart else None
+    if job is not None and 'charts' in job.context and chart in job.context['charts'][0]:
+        charts, project_data, results = job.context['charts']
+        width = request.args.get('width', type=int)
+        if width is not None and not 0 < width <= CHART_MAX_WIDTH:
+            return jsonify({"error": f"width must be between 1 and {CHART_MAX_WIDTH}"}), 400
+        # Jobs that reuse a stored analysis share its rendered charts
+        analysis_key = results.get('analysis_id') or job.id
+        png = rendered_charts.get(analysis_key, chart, width,
+                                  lambda: render_chart(chart, project_data, results, width))
+        if png is not None:
+            return Response(png, mimetype='image/png')
     return send_from_directory(os.path.join(app.root_path, 'results'), filename)
 
-def run_analysis(file_path):
-    """Run analysis in background thread and update status"""
-    global analysis_status
+def run_analysis(job, file_path, output_dir):
+    """Run the analysis of one job on a worker thread, reporting each stage to the job"""
+    project_name = job.name
+    os.makedirs(output_dir, exist_ok=True)
+    job.update("Loading project data...")
+    project_data = load_project_input(file_path)
     
-    try:
-        analysis_status["in_progress"] = True
-        analysis_status["message"] = "Starting analysis..."
-        
-        # Create a custom progress callback to update status
-        def progress_callback(message, progress):
-            analysis_status["message"] = message
-            analysis_status["progress"] = progress
-        
-        # Mock progress updates for demo purposes
-        progress_callback("Loading project data...", 10)
-        time.sleep(0.5)  # Simulate processing time
-        
-        # Run the analysis
-        project_name = os.path.splitext(os.path.basename(file_path))[0]
-        output_dir = os.path.join(app.root_path, 'results')
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # Run actual analysis
-        results = analyze_project(file_path, output_dir, project_name)
-        
-        # Prepare results for JSON
-        results_json = prepare_results_for_json(results, output_dir)
-        
-        # Update status
-        analysis_status["completed"] = True
-        analysis_status["in_progress"] = False
-        analysis_status["progress"] = 100
-        analysis_status["message"] = "Analysis completed successfully"
-        analysis_status["results"] = results_json
-    
-    except Exception as e:
-        analysis_status["error"] = str(e)
-        analysis_status["in_progress"] = False
-        analysis_status["completed"] = True
-        analysis_status["message"] = f"Analysis failed: {str(e)}"
-        import traceback
-        print(traceback.format_exc())
-
-def prepare_results_for_json(results, output_dir):
-    """Prepare analysis results for JSON serialization"""
-    # List of image files
-    image_files = [
-        "pv_ev_curves.png", 
-        "es_metrics.png", 
-        "ieac_forecasts.png", 
-        "completion_forecast.png"
-    ]
+    # The upload directory is per job; record the project under the uploaded
+    # file name so re-uploads of the same file join the same project
+    source_file = os.path.join(app.root_path, 'uploads', os.path.basename(file_path))
+    results = analyze_project(file_path, output_dir, project_name, generate_charts=False,
+                              project_data=project_data, source_file=source_file,
+                              progress_callback=job.update)
+    
+    # Charts are rendered when the page first asks for them
+    charts = available_charts(project_data)
+    job.context['charts'] = (charts, project_data, results)
+    
+    # Prepare results for JSON
+    image_prefix = os.path.basename(output_dir)
+    return prepare_results_for_json(results, image_prefix, charts)
+
+def analyze_upload(job, data, filename, output_dir, settings):
+    """Analyze an uploaded workbook from memory, writing only the requested artifacts"""
+    job.update("Loading project data...")
+    project_data = data_handler.load_project_data(io.BytesIO(data))
+    
+    artifacts = settings["artifacts"]
+    input_hash = None
+    if settings["store"]:
+        input_hash = analysis_input_hash(None, settings["near_critical_k"], settings["prune_paths"],
+                                         content_hash=hashlib.sha256(data).hexdigest())
+    source_file = os.path.join(app.root_path, 'uploads', filename or "upload.xlsx")
+    results = analyze_project(source_file, output_dir, job.name,
+                              near_critical_k=settings["near_critical_k"],
+                              prune_paths=settings["prune_paths"],
+                              generate_charts=False,
+                              write_excel="excel" in artifacts,
+                              save_to_db=settings["store"],
+                              project_data=project_data,
+                              input_hash=input_hash,
+                              progress_callback=job.update)
+    
+    # Requested charts are rendered when their URLs are first fetched
+    charts = available_charts(project_data) if "charts" in artifacts else []
+    if charts:
+        job.context['charts'] = (charts, project_data, results)
+    
+    json_results = prepare_results_for_json(results, job.id, charts)
+    json_results["job_id"] = job.id
+    if "excel" in artifacts:
+        json_results["excel_url"] = f"/results/images/{job.id}/es_analysis_results.xlsx"
+    for key in ("project_id", "analysis_id"):
+        if key in results:
+            json_results[key] = results[key]
+    return json_results
+
+def prepare_results_for_json(results, image_prefix="", charts=()):
+    """
+    Prepare analysis results for JSON serialization in a columnar layout.
+    
+    Each metric is one array indexed by period: overall_metrics holds the
+    arrays "es", "spi_t" and "ieac_t", and path_metrics maps each path to
+    "es", "spi_t", "sv_t" and "ieac_t". controlling_path is one path name per
+    period. images lists the URLs, under results/<image_prefix>/, of the named charts.
+    """
+    def columns(metrics, names):
+        values = list(zip(*metrics)) if metrics else [()] * len(names)
+        return {name: list(column) for name, column in zip(names, values)}
     
     # Convert complex data structures for JSON
     json_safe_results = {
-        "overall_metrics": [
-            {"period": i, "es": m[0], "spi_t": m[1], "ieac_t": m[2]}
-            for i, m in enumerate(results["overall_metrics"])
-        ],
-        "controlling_path": [
-            {"period": i, "path": path}
-            for i, path in enumerate(results["controlling_path"])
-        ],
+        "num_periods": len(results["overall_metrics"]),
+        "overall_metrics": columns(results["overall_metrics"], ("es", "spi_t", "ieac_t")),
+        "controlling_path": list(results["controlling_path"]),
         "images": [
-            {"name": img, "url": f"/results/images/{img}"}
-            for img in image_files if os.path.exists(os.path.join(output_dir, img))
+            {"name": f"{chart}.png", "url": f"/results/images/{image_prefix + '/' if image_prefix else ''}{chart}.png"}
+            for chart in charts
         ],
         "anomalies": [
             {"period": period, "path": details[0], "ieac": details[1]}
@@ -173,15 +328,83 @@ def prepare_results_for_json(results, output_dir):
     }
     
     # Add path metrics
-    json_safe_results["path_metrics"] = {}
-    for path, metrics in results["path_metrics"].items():
-        json_safe_results["path_metrics"][path] = [
-            {"period": i, "es": m[0], "spi_t": m[1], "sv_t": m[2], "ieac_t": m[3]}
-            for i, m in enumerate(metrics)
-        ]
+    json_safe_results["path_metrics"] = {
+        path: columns(metrics, RESULT_METRICS)
+        for path, metrics in results["path_metrics"].items()
+    }
     
     return json_safe_results
 
+def _query_list(args, name):
+    """A comma-separated query parameter as a list, or None when it is absent"""
+    value = args.get(name)
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+def select_results(payload, args):
+    """
+    Narrow a results payload from prepare_results_for_json by query parameters.
+    
+    Args:
+        payload: Columnar results payload
+        args: Query parameters; all are optional:
+              fields: top-level fields to include
+              metrics: metric arrays to include in overall_metrics and path_metrics
+              paths: paths to include in path_metrics
+              controlling_only: "true" to include only paths that control some period
+    
+    Returns:
+        The narrowed payload (sharing the metric arrays with payload)
+    
+    Raises:
+        ValueError: If fields or metrics names an unknown field or metric
+    """
+    fields = _query_list(args, 'fields')
+    metrics = _query_list(args, 'metrics')
+    paths = _query_list(args, 'paths')
+    controlling = set(payload.get("controlling_path") or [])
+    controlling_only = args.get('controlling_only', '').lower() in ('1', 'true', 'yes')
+    
+    if fields is not None:
+        unknown = [field for field in fields if field not in RESULT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        payload = {field: payload[field] for field in fields if field in payload}
+    if metrics is not None:
+        unknown = [metric for metric in metrics if metric not in RESULT_METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    
+    if "overall_metrics" in payload and metrics is not None:
+        payload = {**payload, "overall_metrics": {
+            metric: values for metric, values in payload["overall_metrics"].items() if metric in metrics}}
+    
+    if "path_metrics" in payload and (metrics is not None or paths is not None or controlling_only):
+        selected = payload["path_metrics"]
+        if paths is not None:
+            selected = {path: selected[path] for path in paths if path in selected}
+        if controlling_only:
+            selected = {path: columns for path, columns in selected.items() if path in controlling}
+        if metrics is not None:
+            selected = {path: {metric: columns[metric] for metric in metrics}
+                        for path, columns in selected.items()}
+        payload = {**payload, "path_metrics": selected}
+    
+    return payload
+
+def results_response(payload, etag=None):
+    """Serialize a results payload, deflate-compressed when the client accepts it"""
+    body = json.dumps(payload, separators=(',', ':')).encode()
+    response = Response(body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if len(body) >= DEFLATE_MIN_BYTES and request.accept_encodings['deflate']:
+        response.set_data(zlib.compress(body))
+        response.headers['Content-Encoding'] = 'deflate'
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
 if __name__ == "__main__":
     # Ensure directories exist
     os.makedirs(os.path.join(app.root_path, 'uploads'), exist_ok=True)